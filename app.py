@@ -4,38 +4,61 @@ from data import db_session
 from os import mkdir
 from waitress import serve
 from os.path import exists
-from data.couriers_type import CourierType
+from data.couriers_type import CourierType, courier_types
+from data.dispatch_queries import sync_pool
 from resources.courier_resources import CouriersListResource, CouriersResource
-from resources.order_resources import OrdersListResources, OrdersAssignResources, OrdersCompleteResources
+from resources.metrics_resources import MetricsResource
+from resources.order_resources import OrdersListResources, OrdersAssignResources, OrdersCompleteResources, \
+    OrdersAssignBatchResources, OrdersCompleteBatchResources
 
 app = Flask(__name__)
+app.config.from_object('config')
 api = Api(app)
+app.teardown_appcontext(db_session.remove_session)
 
 
 def add_courier_types():
     session = db_session.create_session()
+    db_session.begin_write(session)
     if sorted(type.type for type in session.query(CourierType).all()) != ['bike', 'car', 'foot']:
         session.query(CourierType).delete()
-        session.commit()
         types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
         for title, carrying, coefficient in types:
             type = CourierType(type=title, carrying=carrying, coefficient=coefficient)
             session.add(type)
         session.commit()
+    courier_types.reload(session)
+    db_session.remove_session()
+
+
+def load_order_pool():
+    sync_pool(db_session.create_session())
+    db_session.remove_session()
+
+
+def init_app(database):
+    """Все, что нужно процессу перед первым запросом: и waitress из main, и WSGI-серверу из wsgi.py"""
+    if not exists('./db'):
+        mkdir('./db')
+    db_session.global_init(database)
+    db_session.set_group_commit(app.config['GROUP_COMMIT'], app.config['GROUP_COMMIT_WINDOW'],
+                                app.config['GROUP_COMMIT_SIZE'])
+    add_courier_types()
+    load_order_pool()
 
 
 api.add_resource(CouriersListResource, '/couriers')
 api.add_resource(CouriersResource, '/couriers/<string:courier_id>')
 api.add_resource(OrdersListResources, '/orders')
 api.add_resource(OrdersAssignResources, '/orders/assign')
+api.add_resource(OrdersAssignBatchResources, '/orders/assign/batch')
 api.add_resource(OrdersCompleteResources, '/orders/complete')
+api.add_resource(OrdersCompleteBatchResources, '/orders/complete/batch')
+api.add_resource(MetricsResource, '/metrics')
 
 
 def main():
-    if not exists('./db'):
-        mkdir('./db')
-    db_session.global_init("db/base.db")
-    add_courier_types()
+    init_app(app.config['DATABASE_URL'])
     # app.run(debug=True, port=5000, host='127.0.0.1')
     serve(app, host='127.0.0.1', port=5000)
 
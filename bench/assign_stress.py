@@ -0,0 +1,90 @@
+"""Параллельные назначения из нескольких процессов: python -m bench.assign_stress [процессов] [потоков] [назначений]
+
+Каждый процесс держит свой пул заказов, как воркер gunicorn. В конце проверяется, что ни один заказ
+не попал в ответы двум курьерам и ответы совпадают с базой.
+"""
+import multiprocessing
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from os import mkdir, remove
+from os.path import exists
+from random import Random
+from time import perf_counter
+
+DB_FILE = 'db/bench_assign_stress.db'
+COURIERS = 300
+ORDERS = 5000
+
+
+def prepare():
+    from app import app, add_courier_types
+    from data import db_session
+
+    db_session.global_init(DB_FILE)
+    add_courier_types()
+    rnd = Random(0)
+    client = app.test_client()
+    client.post('/couriers', json={'data': [
+        {'courier_id': courier_id, 'courier_type': rnd.choice(['foot', 'bike', 'car']),
+         'regions': rnd.sample(range(1, 11), rnd.randint(1, 3)), 'working_hours': ['08:00-20:00']}
+        for courier_id in range(1, COURIERS + 1)]})
+    client.post('/orders', json={'data': [
+        {'order_id': order_id, 'weight': rnd.randint(1, 1000) / 100, 'region': rnd.randint(1, 10),
+         'delivery_hours': ['10:00-12:00']} for order_id in range(1, ORDERS + 1)]})
+
+
+def worker(args):
+    seed, threads, assigns = args
+    from app import app, load_order_pool
+    from data import db_session
+
+    db_session.global_init(DB_FILE)
+    load_order_pool()
+
+    def assign(courier_id):
+        rv = app.test_client().post('/orders/assign', json={'courier_id': courier_id})
+        assert rv.status_code == 200, rv.data
+        return courier_id, [order['id'] for order in rv.get_json()['orders']]
+
+    rnd = Random(seed)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(assign, [rnd.randint(1, COURIERS) for _ in range(assigns)]))
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    assigns = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    if not exists('./db'):
+        mkdir('./db')
+    if exists(DB_FILE):
+        remove(DB_FILE)
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        pool.apply(prepare)
+
+    start = perf_counter()
+    with context.Pool(processes) as pool:
+        results = [result for part in pool.map(worker, [(seed, threads, assigns // processes)
+                                                        for seed in range(processes)]) for result in part]
+    elapsed = perf_counter() - start
+
+    owners = {}
+    for courier_id, order_ids in results:
+        for order_id in order_ids:
+            owners.setdefault(order_id, set()).add(courier_id)
+    double = {order_id: couriers for order_id, couriers in owners.items() if len(couriers) > 1}
+
+    import sqlite3
+    with sqlite3.connect(DB_FILE) as conn:
+        assigned = dict(conn.execute('SELECT order_id, courier_id FROM orders WHERE courier_id IS NOT NULL'))
+    mismatched = {order_id for order_id, couriers in owners.items() if assigned.get(order_id) not in couriers}
+    print(f'{len(results)} назначений за {elapsed:.2f} с ({len(results) / elapsed:.0f}/с), '
+          f'{processes} процессов по {threads} потоков: назначено {len(assigned)} заказов, '
+          f'двойных назначений {len(double)}, расхождений с базой {len(mismatched)}')
+    if double or mismatched:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Пропускная способность /orders/assign под waitress в зависимости от числа потоков:
+python -m bench.assign_threads [потоки через запятую] [курьеров]
+
+Два сценария: у каждого курьера свой район и все курьеры в одном районе (все подбирают заказы
+из одного района пула). Пишущие транзакции назначений в SQLite идут по одной, потоки могут
+выиграть только на чтении и подборе вне транзакции.
+"""
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from os import mkdir
+from os.path import exists
+from threading import Thread
+from time import perf_counter
+from urllib.request import Request, urlopen
+
+from waitress.server import create_server
+
+from app import app, add_courier_types, load_order_pool
+from data import db_session
+
+DB_FILE = 'db/bench_assign_threads.db'
+ORDERS_PER_COURIER = 5
+
+
+def prepare(engine, couriers, shared):
+    db_session.SqlAlchemyBase.metadata.drop_all(engine)
+    db_session.SqlAlchemyBase.metadata.create_all(engine)
+    add_courier_types()
+    client = app.test_client()
+    client.post('/couriers', json={'data': [
+        {'courier_id': courier_id, 'courier_type': 'car', 'regions': [1 if shared else courier_id],
+         'working_hours': ['08:00-20:00']} for courier_id in range(1, couriers + 1)]})
+    client.post('/orders', json={'data': [
+        {'order_id': order_id, 'weight': 10, 'region': 1 if shared else (order_id - 1) // ORDERS_PER_COURIER + 1,
+         'delivery_hours': ['10:00-12:00']} for order_id in range(1, couriers * ORDERS_PER_COURIER + 1)]})
+    load_order_pool()
+
+
+def call(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def run(threads, couriers):
+    server = create_server(app, host='127.0.0.1', port=0, threads=threads)
+    Thread(target=server.run, daemon=True).start()
+    url = f'http://127.0.0.1:{server.effective_port}'
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda courier_id: call(f'{url}/orders/assign', {'courier_id': courier_id}),
+                                    range(1, couriers + 1)))
+    elapsed = perf_counter() - start
+    server.close()
+    assigned = sum(len(result['orders']) for result in results)
+    return couriers / elapsed, assigned
+
+
+def main():
+    thread_counts = [int(count) for count in sys.argv[1].split(',')] if len(sys.argv) > 1 else [1, 2, 4, 8]
+    couriers = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    if not exists('./db'):
+        mkdir('./db')
+    engine = db_session.global_init(DB_FILE)
+    for shared, name in ((False, 'свой район у каждого курьера'), (True, 'один район на всех')):
+        print(name)
+        for threads in thread_counts:
+            prepare(engine, couriers, shared)
+            rate, assigned = run(threads, couriers)
+            print(f'  потоков {threads}: {rate:.0f} назначений/с, заказов назначено {assigned}')
+
+
+if __name__ == '__main__':
+    main()
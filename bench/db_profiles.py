@@ -0,0 +1,50 @@
+"""Назначения и завершения под waitress при разных профилях SQLite: python -m bench.db_profiles [потоков] [курьеров]
+
+Каждый профиль из data.db_session.DB_PROFILES замеряется в своем процессе на новой базе:
+journal_mode=WAL сохраняется в файле базы и пережил бы смену профиля.
+"""
+import multiprocessing
+import sys
+from glob import glob
+from os import mkdir, remove
+from os.path import exists
+
+DB_FILE = 'db/bench_db_profiles.db'
+
+
+def measure(args):
+    profile, threads, couriers = args
+    from bench import assign_threads, group_commit
+    from data import db_session
+
+    for path in glob(DB_FILE + '*'):
+        remove(path)
+    engine = db_session.global_init(DB_FILE, profile)
+    assign_threads.prepare(engine, couriers, False)
+    assign_rate, assigned, waits = assign_threads.run(threads, couriers)
+    group_commit.prepare(engine, couriers)
+    complete_rate, stats = group_commit.run(threads, couriers)
+    db_session.set_group_commit(True)
+    group_commit.prepare(engine, couriers)
+    grouped_rate, stats = group_commit.run(threads, couriers)
+    db_session.set_group_commit(False)
+    return assign_rate, complete_rate, grouped_rate
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    couriers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    if not exists('./db'):
+        mkdir('./db')
+    from data.db_session import DB_PROFILES
+
+    context = multiprocessing.get_context('spawn')
+    for profile in DB_PROFILES:
+        with context.Pool(1) as pool:
+            assign_rate, complete_rate, grouped_rate = pool.apply(measure, [(profile, threads, couriers)])
+        print(f'{profile}: {assign_rate:.0f} назначений/с, {complete_rate:.0f} завершений/с, '
+              f'с group commit {grouped_rate:.0f} завершений/с ({threads} потоков, {couriers} курьеров)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Завершения заказов под waitress с group commit и без него:
+python -m bench.group_commit [потоки через запятую] [курьеров]
+
+У каждого курьера развоз из ORDERS_PER_COURIER заказов, все заказы завершаются параллельными
+POST /orders/complete. Без group commit каждое завершение - своя транзакция и свой fsync.
+"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from os import mkdir
+from os.path import exists
+from threading import Thread
+from time import perf_counter
+
+from waitress.server import create_server
+
+from app import app, add_courier_types, load_order_pool
+from bench.assign_threads import call
+from data import db_session
+
+DB_FILE = 'db/bench_group_commit.db'
+ORDERS_PER_COURIER = 5
+
+
+def prepare(engine, couriers):
+    db_session.SqlAlchemyBase.metadata.drop_all(engine)
+    db_session.SqlAlchemyBase.metadata.create_all(engine)
+    add_courier_types()
+    client = app.test_client()
+    client.post('/couriers', json={'data': [
+        {'courier_id': courier_id, 'courier_type': 'car', 'regions': [courier_id],
+         'working_hours': ['08:00-20:00']} for courier_id in range(1, couriers + 1)]})
+    client.post('/orders', json={'data': [
+        {'order_id': order_id, 'weight': 1, 'region': (order_id - 1) // ORDERS_PER_COURIER + 1,
+         'delivery_hours': ['10:00-12:00']} for order_id in range(1, couriers * ORDERS_PER_COURIER + 1)]})
+    load_order_pool()
+    client.post('/orders/assign/batch', json={'courier_ids': list(range(1, couriers + 1))})
+
+
+def run(threads, couriers):
+    server = create_server(app, host='127.0.0.1', port=0, threads=threads)
+    Thread(target=server.run, daemon=True).start()
+    url = f'http://127.0.0.1:{server.effective_port}'
+    complete_time = (datetime.now() + timedelta(minutes=30)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    completions = [{'courier_id': (order_id - 1) // ORDERS_PER_COURIER + 1, 'order_id': order_id,
+                    'complete_time': complete_time} for order_id in range(1, couriers * ORDERS_PER_COURIER + 1)]
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda completion: call(f'{url}/orders/complete', completion), completions))
+    elapsed = perf_counter() - start
+    stats = call(f'{url}/metrics')['group_commit']
+    server.close()
+    return len(completions) / elapsed, stats
+
+
+def main():
+    thread_counts = [int(count) for count in sys.argv[1].split(',')] if len(sys.argv) > 1 else [1, 4, 8, 16]
+    couriers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    if not exists('./db'):
+        mkdir('./db')
+    engine = db_session.global_init(DB_FILE)
+    for enabled in (False, True):
+        print('с group commit' if enabled else 'без group commit')
+        for threads in thread_counts:
+            prepare(engine, couriers)
+            db_session.set_group_commit(enabled)
+            rate, stats = run(threads, couriers)
+            db_session.set_group_commit(False)
+            groups = f', транзакций {stats["groups"]}' if enabled else ''
+            print(f'  потоков {threads}: {rate:.0f} завершений/с{groups}')
+
+
+if __name__ == '__main__':
+    main()
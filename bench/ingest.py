@@ -0,0 +1,50 @@
+"""Замер скорости пакетной загрузки заказов: python -m bench.ingest [кол-во заказов] [stream]"""
+import json
+import resource
+import sys
+from os import mkdir, remove
+from os.path import exists
+from random import Random
+from time import perf_counter
+
+from app import app, add_courier_types
+from data import db_session
+
+DB_FILE = 'db/bench_ingest.db'
+
+
+def make_orders(count, seed=0):
+    rnd = Random(seed)
+    hours = [f'{h:02d}:00-{h + rnd.randint(1, 3):02d}:30' for h in range(6, 20) for _ in range(4)]
+    return [{'order_id': i,
+             'weight': rnd.randint(1, 5000) / 100,
+             'region': rnd.randint(1, 50),
+             'delivery_hours': rnd.sample(hours, rnd.randint(1, 3))} for i in range(1, count + 1)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    stream = 'stream' in sys.argv[2:]
+    if not exists('./db'):
+        mkdir('./db')
+    if exists(DB_FILE):
+        remove(DB_FILE)
+    db_session.global_init(DB_FILE)
+    add_courier_types()
+
+    orders = make_orders(count)
+    rows = sum(2 + len(order['delivery_hours']) for order in orders)
+    body = json.dumps({'data': orders})
+    del orders
+    client = app.test_client()
+    start = perf_counter()
+    rv = client.post('/orders?stream=1' if stream else '/orders', data=body, content_type='application/json')
+    elapsed = perf_counter() - start
+    assert rv.status_code == 201, rv.data[:200]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(f'{count} заказов ({rows} строк) за {elapsed:.2f} с: '
+          f'{count / elapsed:.0f} заказов/с, {rows / elapsed:.0f} строк/с, пик памяти процесса {peak} МБ')
+
+
+if __name__ == '__main__':
+    main()
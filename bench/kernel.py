@@ -0,0 +1,57 @@
+"""Замер подбора заказов циклом и векторным ядром: python -m bench.kernel [кол-ва заказов через запятую]"""
+import sys
+from random import Random
+from time import perf_counter
+
+from data.time_interval import hours_mask, parse_interval
+from dispatch import kernel
+from dispatch.engine import Candidate, select_orders
+from dispatch.pool import OrderPool
+
+REGIONS = 50
+REPEAT = 20
+# смены курьера на пяти районах: с узким окном цикл просматривает почти все заказы его районов
+SHIFTS = [('весь день', hours_mask([parse_interval('06:00-23:00')])),
+          ('края дня', hours_mask([parse_interval('05:00-06:05'), parse_interval('22:20-23:00')])),
+          ('узкое окно', hours_mask([parse_interval('05:30-06:01')])),
+          ('нет подходящих', hours_mask([parse_interval('04:00-05:00')]))]
+
+
+def make_candidates(count, seed=0):
+    rnd = Random(seed)
+    hours = [parse_interval(f'{h:02d}:00-{h + rnd.randint(1, 3):02d}:30') for h in range(6, 20) for _ in range(4)]
+    return [Candidate(i, rnd.randint(1, 5000) / 100, frozenset([rnd.randint(1, REGIONS)]),
+                      hours_mask(rnd.sample(hours, rnd.randint(1, 3)))) for i in range(1, count + 1)]
+
+
+def timed(select):
+    start = perf_counter()
+    for _ in range(REPEAT):
+        chosen = select()
+    return (perf_counter() - start) / REPEAT * 1000, chosen
+
+
+def main():
+    if not kernel.available:
+        sys.exit('Для замера нужен numpy')
+    counts = [int(count) for count in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10000, 100000, 1000000]
+    regions = {1, 2, 3, 4, 5}
+    for count in counts:
+        candidates = make_candidates(count)
+        pool = OrderPool()
+        start = perf_counter()
+        pool.load(candidates, None)
+        pool.columns.flush()
+        print(f'{count} заказов, загрузка пула {perf_counter() - start:.2f} с')
+        for name, mask in SHIFTS:
+            loop, expected = timed(lambda: select_orders(pool.candidates(regions), regions, mask, 50))
+            vector, chosen = timed(lambda: pool.columns.select(regions, mask, 50))
+            assert chosen == expected
+            combined, chosen = timed(lambda: pool.select(regions, mask, 50))
+            assert chosen == expected
+            print(f'  {name}: цикл {loop:.2f} мс, numpy {vector:.2f} мс, OrderPool.select {combined:.2f} мс, '
+                  f'выбрано {len(chosen)}')
+
+
+if __name__ == '__main__':
+    main()
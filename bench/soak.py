@@ -0,0 +1,95 @@
+"""Долгий прогон запросов с замером памяти и соединений: python -m bench.soak [запросов] [потоков]
+
+Запросы идут через waitress циклами по курьеру: новый заказ, назначение, завершение, профиль курьера
+и смена его часов. Каждую десятую часть прогона печатаются RSS процесса, число живых сессий
+SQLAlchemy и объектов в их identity map и занятые соединения пула - все они не должны расти.
+"""
+import gc
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from glob import glob
+from os import mkdir, remove, sysconf
+from os.path import exists
+from threading import Thread
+from time import perf_counter
+from urllib.request import Request, urlopen
+
+from sqlalchemy.orm import Session
+from waitress.server import create_server
+
+from app import app, add_courier_types, load_order_pool
+from data import db_session
+
+DB_FILE = 'db/bench_soak.db'
+COURIERS = 50
+CYCLE = 5
+
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def sessions():
+    alive = [obj for obj in gc.get_objects() if isinstance(obj, Session)]
+    return len(alive), sum(len(sess.identity_map) for sess in alive)
+
+
+def call(url, body=None, method=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    with urlopen(request) as response:
+        return response.status
+
+
+def cycle(url, number):
+    """Один цикл запросов курьера, номер цикла - id нового заказа"""
+    courier_id = number % COURIERS + 1
+    complete_time = (datetime.now() + timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    call(f'{url}/orders', {'data': [{'order_id': number, 'weight': 1, 'region': courier_id,
+                                     'delivery_hours': ['00:00-23:59']}]})
+    call(f'{url}/orders/assign', {'courier_id': courier_id})
+    call(f'{url}/orders/complete/batch', {'data': [{'courier_id': courier_id, 'order_id': number,
+                                                    'complete_time': complete_time}]})
+    call(f'{url}/couriers/{courier_id}')
+    hours = ['00:00-23:59'] if number % 2 else ['00:00-12:00', '12:00-23:59']
+    call(f'{url}/couriers/{courier_id}', {'working_hours': hours}, method='PATCH')
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    if not exists('./db'):
+        mkdir('./db')
+    for path in glob(DB_FILE + '*'):
+        remove(path)
+    db_session.global_init(DB_FILE)
+    add_courier_types()
+    app.test_client().post('/couriers', json={'data': [
+        {'courier_id': courier_id, 'courier_type': 'car', 'regions': [courier_id], 'working_hours': ['00:00-23:59']}
+        for courier_id in range(1, COURIERS + 1)]})
+    load_order_pool()
+
+    server = create_server(app, host='127.0.0.1', port=0, threads=threads)
+    Thread(target=server.run, daemon=True).start()
+    url = f'http://127.0.0.1:{server.effective_port}'
+    cycles = requests // CYCLE
+    step = max(cycles // 10, 1)
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for first in range(1, cycles + 1, step):
+            list(executor.map(lambda number: cycle(url, number), range(first, min(first + step, cycles + 1))))
+            gc.collect()
+            alive, identities = sessions()
+            pool = db_session.pool_stats()
+            done = (min(first + step, cycles + 1) - 1) * CYCLE
+            print(f'{done} запросов за {perf_counter() - start:.0f} с: RSS {rss_mb():.1f} МБ, сессий {alive}, '
+                  f'объектов в них {identities}, соединений занято {pool["checked_out"]} из {pool["size"]} '
+                  f'(+{max(pool["overflow"], 0)})')
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Снятие заказов при смене типа курьера: python -m bench.trimming [размеры развозов через запятую]
+
+Развоз машины (50 кг) из заданного числа заказов переводится на велосипед и пешехода, для каждой
+стратегии из dispatch.trimming печатаются средний оставшийся вес, сколько заказов снято и время.
+"""
+import sys
+from random import Random
+from time import perf_counter
+
+from dispatch.engine import Candidate
+from dispatch.trimming import first_fit, heaviest_first, max_weight
+
+DELIVERIES = 200
+CAR = 50
+DOWNGRADES = [('bike', 15), ('foot', 10)]
+STRATEGIES = [('heaviest', heaviest_first), ('first_fit', first_fit), ('knapsack', max_weight)]
+
+
+def make_delivery(size, rnd):
+    # веса в сотых долях, в сумме почти вся грузоподъемность машины
+    top = max(2, round(2 * CAR * 100 / size))
+    weights = [rnd.randint(1, top) / 100 for _ in range(size)]
+    while sum(weights) > CAR:
+        weights.pop()
+    return [Candidate(order_id, weight, frozenset([1]), 1) for order_id, weight in enumerate(weights, 1)]
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1].split(',')] if len(sys.argv) > 1 else [5, 20, 50, 200]
+    for size in sizes:
+        rnd = Random(size)
+        deliveries = [make_delivery(size, rnd) for _ in range(DELIVERIES)]
+        print(f'развоз из {size} заказов, {DELIVERIES} развозов')
+        for courier_type, carrying in DOWNGRADES:
+            for name, trim in STRATEGIES:
+                kept = dropped = 0
+                worst = 0
+                start = perf_counter()
+                for delivery in deliveries:
+                    call = perf_counter()
+                    removed = set(trim(delivery, carrying))
+                    worst = max(worst, perf_counter() - call)
+                    kept += sum(candidate.weight for candidate in delivery if candidate.order_id not in removed)
+                    dropped += len(removed)
+                elapsed = (perf_counter() - start) / DELIVERIES * 1000
+                print(f'  {courier_type} {name}: осталось {kept / DELIVERIES:.2f} кг из {carrying}, '
+                      f'снято {dropped / DELIVERIES:.1f} заказов, {elapsed:.3f} мс (макс. {worst * 1000:.3f} мс)')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,5 +3,8 @@ from . import regions
 from . import couriers_type
 from . import intervals
 from . import intervals_delivery
+from . import deliveries
 from . import orders
 from . import orders_regions
+from . import pool_state
+from . import courier_stats
@@ -0,0 +1,77 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import bindparam
+
+from .db_session import in_chunks
+from .dispatch_queries import lock_couriers
+from .orders import Order
+from .stats_queries import record_completions
+
+# то же, что принимает datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+TIMESTAMP_RE = re.compile(r'(\d{4})-(\d\d?)-(\d\d?)T(\d\d?):(\d\d?):(\d\d?)\.(\d{1,6})Z')
+
+COMPLETED = 'completed'
+# заказ уже был завершен раньше, повтор ничего не меняет
+ALREADY_COMPLETED = 'already_completed'
+REJECTED = 'rejected'
+
+Completion = namedtuple('Completion', ['order_id', 'courier_id', 'assign_time', 'complete_time', 'delivery_id'])
+
+_complete = Order.__table__.update().where(Order.__table__.c.order_id == bindparam('b_order_id')).where(
+    Order.__table__.c.complete_time == None).values(complete_time=bindparam('b_complete_time'))
+
+
+class CompletionConflict(Exception):
+    """Заказ из пачки завершили или сняли с курьера параллельно, транзакцию надо откатить и повторить"""
+
+
+def parse_timestamp(value):
+    match = TIMESTAMP_RE.fullmatch(value)
+    if match is None:
+        raise ValueError(f'Некорректное время {value!r}')
+    *parts, fraction = match.groups()
+    return datetime(*map(int, parts), int(fraction.ljust(6, '0')))
+
+
+def complete_orders(sess, items):
+    """Завершает заказы пачкой в текущей транзакции, возвращает статус каждого элемента в порядке items.
+
+    items - [(courier_id, order_id, complete_time)], элемент None - не прошел проверку. Заказы читаются
+    одним запросом после блокировки курьеров, завершаются одним UPDATE ... WHERE complete_time IS NULL,
+    повторное завершение заказа тем же курьером - ALREADY_COMPLETED. Коммитит вызывающий, обычно
+    через db_session.write.
+    """
+    valid = [item for item in items if item is not None]
+    if valid:
+        lock_couriers(sess, sorted({courier_id for courier_id, order_id, complete_time in valid}))
+    orders = {}
+    for chunk in in_chunks({order_id for courier_id, order_id, complete_time in valid}):
+        for order in sess.query(Order.order_id, Order.courier_id, Order.assign_time, Order.complete_time,
+                                Order.delivery_id).filter(Order.order_id.in_(chunk)):
+            orders[order.order_id] = order
+
+    statuses, completions = [], []
+    for item in items:
+        order = orders.get(item[1]) if item is not None else None
+        if order is None or order.courier_id != item[0]:
+            statuses.append(REJECTED)
+        elif order.complete_time is not None:
+            statuses.append(ALREADY_COMPLETED)
+        elif order.assign_time > item[2]:
+            statuses.append(REJECTED)
+        else:
+            statuses.append(COMPLETED)
+            # следующие элементы с этим же заказом - уже повторы
+            orders[order.order_id] = order = Completion(order.order_id, order.courier_id, order.assign_time,
+                                                        item[2], order.delivery_id)
+            completions.append(order)
+
+    if completions:
+        updated = sess.execute(_complete, [{'b_order_id': order.order_id, 'b_complete_time': order.complete_time}
+                                           for order in completions]).rowcount
+        if updated != len(completions):
+            raise CompletionConflict
+        record_completions(sess, completions)
+    return statuses
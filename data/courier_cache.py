@@ -0,0 +1,114 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+from config import COURIER_CACHE_SIZE
+from .couriers import Courier
+from .db_session import in_chunks
+from .couriers_type import courier_types
+from .intervals import Interval
+from .regions import Regions
+from .time_interval import TimeInterval, unpack_mask
+
+# неизменяемый снимок курьера: regions - множество для подбора, region_list и working_hours - как в ответах API
+CourierProfile = namedtuple('CourierProfile', ['courier_id', 'version', 'courier_type', 'carrying', 'regions',
+                                               'region_list', 'hours_mask', 'working_hours'])
+
+
+class LRUCache:
+    """Ограниченный словарь: при переполнении вытесняется ключ, к которому дольше всего не обращались"""
+
+    def __init__(self, max_size=COURIER_CACHE_SIZE):
+        self.lock = Lock()
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.items), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+# снимки курьеров для назначения, PATCH и GET: courier_id -> CourierProfile
+profiles = LRUCache()
+# тела ответов GET /couriers/<id>: courier_id -> (версия курьера, тело)
+bodies = LRUCache()
+
+
+def invalidate(courier_ids):
+    """Сбрасывает все, что процесс запомнил о курьерах; вызывается после коммита изменений"""
+    profiles.discard(courier_ids)
+    bodies.discard(courier_ids)
+
+
+def load_profile(sess, courier_id):
+    courier = sess.query(Courier.version, Courier.courier_type, Courier.hours_mask).filter(
+        Courier.courier_id == courier_id).first()
+    if courier is None:
+        return None
+    region_list = tuple(region for region, in sess.query(Regions.region).filter(Regions.courier_id == courier_id))
+    working_hours = tuple(str(TimeInterval.from_times(time_start, time_stop)) for time_start, time_stop in sess.query(
+        Interval.time_start, Interval.time_stop).filter(Interval.courier_id == courier_id))
+    carrying = courier_types[courier.courier_type].carrying
+    return CourierProfile(courier_id, courier.version, courier.courier_type, carrying, frozenset(region_list),
+                          region_list, unpack_mask(courier.hours_mask), working_hours)
+
+
+def courier_profile(sess, courier_id, version=None):
+    """Снимок курьера или None, если его нет.
+
+    Снимок из кэша сверяется с версией курьера в базе (ее можно передать, если она уже прочитана),
+    поэтому изменения из других процессов тоже не останутся незамеченными.
+    """
+    if version is None:
+        version = sess.query(Courier.version).filter(Courier.courier_id == courier_id).scalar()
+        if version is None:
+            return None
+    profile = profiles.get(courier_id)
+    if profile is not None and profile.version == version:
+        return profile
+    profile = load_profile(sess, courier_id)
+    if profile is not None:
+        profiles.put(courier_id, profile)
+    return profile
+
+
+def courier_profiles(sess, courier_ids):
+    """Снимки сразу нескольких курьеров: {courier_id: CourierProfile}, отсутствующих в базе в ответе нет"""
+    versions = {}
+    for chunk in in_chunks(courier_ids):
+        versions.update(sess.query(Courier.courier_id, Courier.version).filter(Courier.courier_id.in_(chunk)).all())
+    return {courier_id: courier_profile(sess, courier_id, version) for courier_id, version in versions.items()}
+
+
+def cache_stats():
+    return {'profiles': profiles.stats(), 'bodies': bodies.stats()}
+
+
+def cached_body(courier_id, version):
+    entry = bodies.get(courier_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    return None
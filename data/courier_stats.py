@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey
+
+from .db_session import SqlAlchemyBase
+
+
+class CourierStats(SqlAlchemyBase):
+    """Завершенные развозы курьера и заработок, обновляются в транзакции, которая завершает развоз"""
+    __tablename__ = 'courier_stats'
+
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), primary_key=True)
+    completed_deliveries = Column(Integer, nullable=False, default=0)
+    earnings = Column(Integer, nullable=False, default=0)
+
+
+class CourierRegionStats(SqlAlchemyBase):
+    """Сумма времени доставки курьера в районе, обновляется при завершении каждого заказа.
+
+    Промежутки между завершениями по порядку складываются в last_complete_time - first_assign_time,
+    поэтому сумма хранится целыми микросекундами, а первый заказ района - чтобы принять и завершение,
+    пришедшее не по порядку.
+    """
+    __tablename__ = 'courier_region_stats'
+
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), primary_key=True)
+    region = Column(Integer, primary_key=True)
+    orders_count = Column(Integer, nullable=False)
+    delivery_us = Column(BigInteger, nullable=False)
+    first_order_id = Column(Integer, nullable=False)
+    first_complete_time = Column(DateTime, nullable=False)
+    first_assign_time = Column(DateTime, nullable=False)
+    last_complete_time = Column(DateTime, nullable=False)
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, LargeBinary
 from .db_session import SqlAlchemyBase, create_session
 from sqlalchemy.orm import relation, validates
-from .couriers_type import CourierType
+from .couriers_type import courier_types
 
 
 class Courier(SqlAlchemyBase):
@@ -9,6 +9,10 @@ class Courier(SqlAlchemyBase):
 
     courier_id = Column(Integer, primary_key=True, autoincrement=True)
     courier_type = Column(String)
+    # рабочие часы минутной маской, см. data.time_interval.hours_mask
+    hours_mask = Column(LargeBinary)
+    # растет в каждой транзакции, которая может изменить GET /couriers/<id>, из нее строится ETag
+    version = Column(Integer, nullable=False, server_default='1')
     # 1 - название класса, который ссылается сюда, 2 - название этого класса
     regions = relation('Regions', back_populates='courier')
     intervals = relation('Interval', back_populates='courier')
@@ -16,14 +20,13 @@ class Courier(SqlAlchemyBase):
 
     @validates('courier_id')
     def validate_courier_id(self, key, value):
+        assert isinstance(value, int) and value > 0
         session = create_session()
-        ids = [courier.courier_id for courier in session.query(Courier).all()]
-        assert value not in ids and isinstance(value, int) and value > 0
+        with session.no_autoflush:
+            assert session.query(Courier.courier_id).filter(Courier.courier_id == value).first() is None
         return value
 
     @validates('courier_type')
     def validate_courier_type(self, key, value):
-        session = create_session()
-        types = [courier_type.type for courier_type in session.query(CourierType).all()]
-        assert value in types
+        assert value in courier_types
         return value
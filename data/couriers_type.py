@@ -1,6 +1,9 @@
+from collections import namedtuple
+from types import MappingProxyType
+
 from sqlalchemy import Column, String, Integer
 from sqlalchemy.orm import validates
-from .db_session import SqlAlchemyBase
+from .db_session import SqlAlchemyBase, create_session
 
 
 class CourierType(SqlAlchemyBase):
@@ -24,3 +27,50 @@ class CourierType(SqlAlchemyBase):
     def validate_coefficient(self, key, value):
         assert isinstance(value, int)
         return value
+
+
+# сколько разных неизвестных типов помнит CourierTypeRegistry, дальше каждый промах снова читает таблицу
+MISSING_LIMIT = 1000
+
+CourierTypeInfo = namedtuple('CourierTypeInfo', ['carrying', 'coefficient'])
+
+
+class CourierTypeRegistry:
+    """Типы курьеров из couriers_type в памяти процесса: type -> CourierTypeInfo.
+
+    Таблица заполняется при старте (app.add_courier_types, там же reload) и дальше не меняется. Если тип
+    не найден, таблица перечитывается один раз - вдруг ее заполнили уже после загрузки, - а сам промах
+    запоминается до следующего reload, чтобы запрос с неизвестными типами не читал таблицу на каждый.
+    """
+
+    def __init__(self):
+        self.types = MappingProxyType({})
+        self.missing = frozenset()
+
+    def load(self, sess=None):
+        sess = sess or create_session()
+        self.types = MappingProxyType({row.type: CourierTypeInfo(row.carrying, row.coefficient)
+                                       for row in sess.query(CourierType)})
+
+    def reload(self, sess=None):
+        self.load(sess)
+        self.missing = frozenset()
+
+    def __contains__(self, courier_type):
+        return self.get(courier_type) is not None
+
+    def __getitem__(self, courier_type):
+        info = self.get(courier_type)
+        if info is None:
+            raise KeyError(courier_type)
+        return info
+
+    def get(self, courier_type):
+        if courier_type not in self.types and courier_type not in self.missing:
+            self.load()
+            if courier_type not in self.types and len(self.missing) < MISSING_LIMIT:
+                self.missing = self.missing | {courier_type}
+        return self.types.get(courier_type)
+
+
+courier_types = CourierTypeRegistry()
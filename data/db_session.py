@@ -1,15 +1,105 @@
+from contextlib import ExitStack, nullcontext
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 from sqlalchemy.orm import Session
 import sqlalchemy.ext.declarative as dec
 
+from config import DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_PROFILE
+
 SqlAlchemyBase = dec.declarative_base()
 
+# сколько значений отправляем в один IN (...), чтобы не упереться в лимит переменных SQLite
+IN_CHUNK_SIZE = 500
+# сколько секунд пишущая транзакция ждет блокировку базы, прежде чем упасть с "database is locked";
+# назначения из нескольких процессов и потоков встают за ней в очередь
+SQLITE_BUSY_TIMEOUT = 30
+# group commit: сколько секунд пишущий поток ждет следующие работы (0 - группу составляют работы,
+# накопившиеся за время предыдущего коммита) и сколько работ самое большее попадает в одну транзакцию
+GROUP_COMMIT_WINDOW = 0
+GROUP_COMMIT_SIZE = 64
+# базы, в которых назначение захватывает заказы через SELECT ... FOR UPDATE SKIP LOCKED
+# (см. data.dispatch_queries.claim_orders)
+SKIP_LOCKED_DIALECTS = frozenset(['postgresql', 'mysql', 'oracle'])
+# PRAGMA SQLite, которые выполняются на каждом соединении, профиль выбирается в config.DB_PROFILE.
+# default - настройки SQLite как есть; fast - WAL (чтения не ждут пишущую транзакцию),
+# synchronous=NORMAL (в WAL fsync только при checkpoint, после сбоя питания могут пропасть последние
+# транзакции, но не целостность базы), чтение через mmap и кэш страниц на 64 МБ
+DB_PROFILES = {
+    'default': {},
+    'fast': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 256 * 1024 * 1024,
+             'cache_size': -64 * 1024, 'busy_timeout': SQLITE_BUSY_TIMEOUT * 1000, 'foreign_keys': 'ON'},
+}
+
 __factory = None
 __engine = None
+__writer = None
+__writer_lock = Lock()
+
+
+def set_pragmas(engine, pragmas):
+    """Выполняет PRAGMA из pragmas на каждом новом соединении engine"""
+    @sa.event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def begin_transactions(engine):
+    """Пишущие транзакции SQLite открывает сам engine: BEGIN IMMEDIATE для сессий из begin_write.
+
+    pysqlite начинает транзакцию только перед INSERT/UPDATE/DELETE и не знает про SAVEPOINT: RELEASE
+    savepoint, открытого первым в транзакции, сразу коммитит его изменения. Поэтому pysqlite
+    больше не управляет транзакциями (isolation_level = None, обход из документации SQLAlchemy), а BEGIN
+    выполняется в событии begin. Чтения вне begin_write, как и раньше, идут без транзакции: BEGIN на
+    каждую сессию держал бы блокировку чтения до ее конца, и без WAL коммиты ждали бы всех читателей.
+    Все, что пишет, должно открывать транзакцию через begin_write, иначе каждая команда коммитится сама.
+    """
+    @sa.event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @sa.event.listens_for(engine, 'begin')
+    def begin(connection):
+        if connection.get_execution_options().get('write'):
+            connection.execute('BEGIN IMMEDIATE')
+
+
+def begin_write(sess):
+    """Заканчивает текущую транзакцию sess (незакоммиченные изменения теряются) и открывает пишущую.
+
+    В SQLite это BEGIN IMMEDIATE: блокировка записи берется и ждется сразу, до первого чтения, поэтому
+    прочитанное в транзакции никто не изменит до ее коммита, а первая запись не упадет
+    с "database is locked".
+    """
+    sess.rollback()
+    sess.connection(execution_options={'write': True})
 
 
-def global_init(db_file):
+def effective_pragmas(engine):
+    """Значения всех PRAGMA профилей на соединении engine - то, что база приняла на самом деле"""
+    names = sorted({name for pragmas in DB_PROFILES.values() for name in pragmas})
+    with engine.connect() as connection:
+        return {name: connection.execute(f'PRAGMA {name}').scalar() for name in names}
+
+
+def database_url(database):
+    """URL SQLAlchemy для database: полного URL (postgresql://...) или пути к файлу SQLite"""
+    database = database.strip()
+    return sa.engine.url.make_url(database if '://' in database else f'sqlite:///{database}')
+
+
+def skip_locked(sess):
+    """Умеет ли база сессии sess пропускать строки, заблокированные другими транзакциями"""
+    return sess.get_bind().dialect.name in SKIP_LOCKED_DIALECTS
+
+
+def global_init(db_file, profile=DB_PROFILE):
     global __factory, __engine
 
     if __factory:
@@ -17,21 +107,217 @@ def global_init(db_file):
 
     if not db_file or not db_file.strip():
         raise Exception("Необходимо указать файл базы данных.")
+    if profile not in DB_PROFILES:
+        raise Exception(f"Неизвестный профиль базы данных {profile!r}, есть: {', '.join(DB_PROFILES)}.")
 
-    conn_str = f'sqlite:///{db_file.strip()}?check_same_thread=False'
-    print(f"Подключение к базе данных по адресу {conn_str}")
+    url = database_url(db_file)
+    # repr скрывает пароль
+    print(f"Подключение к базе данных по адресу {url!r}")
+    sqlite = url.get_backend_name() == 'sqlite'
 
-    # engine = sa.create_engine(conn_str, echo=True)
-    engine = sa.create_engine(conn_str)
-    __factory = orm.sessionmaker(bind=engine)
+    # engine = sa.create_engine(url, echo=True)
+    options = {'pool_recycle': DB_POOL_RECYCLE, 'pool_pre_ping': DB_POOL_PRE_PING}
+    if sqlite:
+        options['connect_args'] = {'timeout': SQLITE_BUSY_TIMEOUT, 'check_same_thread': False}
+    if not sqlite or url.database not in (None, '', ':memory:'):
+        # по умолчанию файловая SQLite открывает новое соединение на каждую сессию (NullPool), пул держит
+        # их открытыми: запросы не платят за открытие файла и PRAGMA профиля. Базе в памяти пул не нужен:
+        # у каждого ее соединения была бы своя пустая база
+        options.update(poolclass=sa.pool.QueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                       pool_timeout=DB_POOL_TIMEOUT)
+    engine = sa.create_engine(url, **options)
+    if sqlite:
+        begin_transactions(engine)
+        set_pragmas(engine, DB_PROFILES[profile])
+        settings = ', '.join(f'{name}={value}' for name, value in effective_pragmas(engine).items())
+        print(f"Профиль базы данных {profile}: {settings}")
+    __factory = orm.scoped_session(orm.sessionmaker(bind=engine))
 
     from . import __all_models
+    from . import migrations
 
     SqlAlchemyBase.metadata.create_all(engine)
+    migrations.upgrade(engine)
     __engine = engine
     return engine
 
 
+def set_group_commit(enabled, window=GROUP_COMMIT_WINDOW, size=GROUP_COMMIT_SIZE):
+    """Включает или выключает group commit для write, выключение дожидается уже принятых работ"""
+    global __writer
+    with __writer_lock:
+        if __writer is not None:
+            __writer.stop()
+            __writer = None
+        if enabled:
+            __writer = GroupCommitWriter(create_session, window, size)
+
+
+def group_commit_stats():
+    writer = __writer
+    if writer is None:
+        return {'enabled': False}
+    return {'enabled': True, 'groups': writer.groups, 'committed': writer.committed}
+
+
+def write(work, lock=None, after_commit=None):
+    """Выполняет work(sess) в пишущей транзакции и возвращает его результат или пробрасывает его исключение.
+
+    С group commit работа уходит единственному пишущему потоку, без него - выполняется в сессии потока
+    в своей пишущей транзакции (begin_write) и сразу коммитится. after_commit(результат) вызывается
+    только после удачного коммита; коммит и after_commit выполняются под lock, если он задан, - так
+    назначение и PATCH курьера применяют изменение к пулу заказов процесса в порядке коммитов
+    (см. data.dispatch_queries.write_pool_change).
+
+    Загрузка через write не идет: она держит транзакцию, пока читает тело запроса, и заняла бы пишущий
+    поток на все это время.
+    """
+    writer = __writer
+    if writer is not None:
+        return writer.submit(WriteJob(work, lock, after_commit))
+    sess = create_session()
+    try:
+        begin_write(sess)
+        result = work(sess)
+        with lock or nullcontext():
+            sess.commit()
+            if after_commit is not None:
+                after_commit(result)
+    except BaseException:
+        sess.rollback()
+        raise
+    return result
+
+
 def create_session() -> Session:
+    """Сессия текущего потока: внутри запроса все вызовы возвращают одну и ту же"""
     global __factory
     return __factory()
+
+
+def remove_session(exception=None):
+    """Закрывает сессию текущего потока и возвращает ее соединение в пул"""
+    if __factory is not None:
+        __factory.remove()
+
+
+def pool_stats():
+    pool = __engine.pool
+    if not isinstance(pool, sa.pool.QueuePool):
+        # SQLite в памяти: одно соединение на поток, считать нечего
+        return {'class': type(pool).__name__}
+    return {'size': pool.size(), 'checked_out': pool.checkedout(), 'overflow': pool.overflow()}
+
+
+def in_chunks(values):
+    values = list(values)
+    for i in range(0, len(values), IN_CHUNK_SIZE):
+        yield values[i:i + IN_CHUNK_SIZE]
+
+
+class WriteJob:
+    def __init__(self, work, lock=None, after_commit=None):
+        self.work = work
+        self.lock = lock
+        self.after_commit = after_commit
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        self.result, self.error = result, error
+        self.done.set()
+
+
+class GroupCommitWriter:
+    """Единственный пишущий поток: собирает работы в группы и коммитит каждую группу одной транзакцией.
+
+    Группа набирается window секунд после первой работы, но не больше size штук; при window = 0
+    в нее попадают работы, которые уже ждут в очереди, то есть пришли за время предыдущего коммита.
+    Каждая работа выполняется в своем savepoint, поэтому ошибка одной откатывает только ее и достается
+    только ее вызывающему; если не прошел сам коммит, ошибку получают все работы группы.
+    Транзакция группы открывается через begin_write. Коммит идет под lock всех успешных работ,
+    их after_commit вызываются под ними же, в порядке работ в группе.
+    """
+
+    def __init__(self, session_factory, window=GROUP_COMMIT_WINDOW, size=GROUP_COMMIT_SIZE):
+        self.session_factory = session_factory
+        self.window = window
+        self.size = size
+        self.jobs = Queue()
+        self.groups = 0
+        self.committed = 0
+        self.thread = Thread(target=self.run, name='group-commit-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def stop(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+    def collect(self, first):
+        group = [first]
+        deadline = monotonic() + self.window
+        while len(group) < self.size:
+            try:
+                job = self.jobs.get(timeout=max(deadline - monotonic(), 0))
+            except Empty:
+                break
+            if job is None:
+                self.jobs.put(None)
+                break
+            group.append(job)
+        return group
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            self.commit_group(self.collect(job))
+
+    def commit_group(self, group):
+        sess = self.session_factory()
+        outcomes = []
+        try:
+            begin_write(sess)
+            for job in group:
+                try:
+                    with sess.begin_nested():
+                        outcomes.append((job, job.work(sess), None))
+                except Exception as error:
+                    outcomes.append((job, None, error))
+            locks = {id(job.lock): job.lock for job, result, error in outcomes
+                     if error is None and job.lock is not None}
+            with ExitStack() as stack:
+                for lock in locks.values():
+                    stack.enter_context(lock)
+                sess.commit()
+                outcomes = [self.after_commit(job, result, error) for job, result, error in outcomes]
+        except Exception as error:
+            sess.rollback()
+            for job in group:
+                job.finish(error=error)
+            return
+        finally:
+            sess.close()
+        self.groups += 1
+        self.committed += len(group)
+        for job, result, error in outcomes:
+            job.finish(result, error)
+
+    @staticmethod
+    def after_commit(job, result, error):
+        if error is None and job.after_commit is not None:
+            try:
+                job.after_commit(result)
+            except Exception as after_error:
+                # коммит уже прошел, ошибка достается только этой работе
+                return job, None, after_error
+        return job, result, error
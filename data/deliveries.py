@@ -0,0 +1,27 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy.orm import relation
+
+from .db_session import SqlAlchemyBase
+
+
+class Delivery(SqlAlchemyBase):
+    """Развоз: заказы, выданные курьеру одним назначением.
+
+    orders_count уменьшается, когда заказ снимают с курьера, completed_count растет с каждым завершением,
+    развоз завершен, когда они сравнялись.
+    """
+    __tablename__ = 'deliveries'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), index=True)
+    # тип курьера на момент назначения, по нему считается оплата
+    courier_type = Column(String, nullable=False)
+    assign_time = Column(DateTime, nullable=False)
+    orders_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+
+    orders = relation('Order', back_populates='delivery')
+
+    @property
+    def finished(self):
+        return self.completed_count == self.orders_count > 0
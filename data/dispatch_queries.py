@@ -0,0 +1,200 @@
+from uuid import uuid4
+
+from dispatch.engine import Candidate
+from dispatch.pool import pool
+from .couriers import Courier
+from .db_session import in_chunks, skip_locked, write
+from .deliveries import Delivery
+from .orders import Order
+from .orders_regions import OrderRegion
+from .pool_state import PoolState
+from .regions import Regions
+from .time_interval import unpack_mask
+
+# состояние пула, пока в базе нет строки pool_state
+NO_STATE = ('', 0)
+
+
+def load_candidates(sess, *criteria):
+    """Заказы, подходящие под criteria, вместе с районами - одним запросом"""
+    orders = {}
+    for order_id, weight, mask, region in sess.query(
+            Order.order_id, Order.weight, Order.hours_mask, OrderRegion.region).join(
+            OrderRegion, OrderRegion.order_id == Order.order_id).filter(*criteria):
+        orders.setdefault(order_id, (weight, set(), unpack_mask(mask)))[1].add(region)
+    return [Candidate(order_id, weight, frozenset(regions), mask)
+            for order_id, (weight, regions, mask) in orders.items()]
+
+
+def courier_regions(sess, courier_id):
+    return {region for region, in sess.query(Regions.region).filter(Regions.courier_id == courier_id)}
+
+
+def active_deliveries(sess, courier_ids):
+    """Незавершенные заказы курьеров: {courier_id: [(order_id, assign_time)]} по возрастанию order_id"""
+    deliveries = {}
+    for chunk in in_chunks(courier_ids):
+        for courier_id, order_id, assign_time in sess.query(Order.courier_id, Order.order_id, Order.assign_time).filter(
+                Order.courier_id.in_(chunk), Order.complete_time == None).order_by(Order.order_id):
+            deliveries.setdefault(courier_id, []).append((order_id, assign_time))
+    return deliveries
+
+
+def lock_couriers(sess, courier_ids):
+    """Увеличивает версии курьеров в пишущей транзакции (begin_write) и не дает параллельно менять тех же курьеров.
+
+    В SQLite транзакция уже держит блокировку записи всей базы, в остальных базах UPDATE берет блокировку строк.
+    Незавершенные заказы курьера надо проверять уже после него. Если транзакция откатится,
+    версия останется прежней.
+    """
+    for chunk in in_chunks(courier_ids):
+        sess.query(Courier).filter(Courier.courier_id.in_(chunk)).update(
+            {Courier.version: Courier.version + 1}, synchronize_session=False)
+
+
+def claim_orders(sess, order_ids, courier_id, assign_time, courier_type, delivery_id=None, skipped=None):
+    """Привязывает к курьеру те из order_ids, которые еще ни за кем не закреплены, возвращает множество их id.
+
+    Условие courier_id IS NULL проверяется самим UPDATE, поэтому заказ, который успел забрать
+    другой поток или процесс, здесь не перезапишется. В базах с SKIP LOCKED заказы, строки которых
+    сейчас заблокированы чужой транзакцией, не ждут ее конца, а пропускаются и добавляются в skipped.
+    """
+    locking = skip_locked(sess)
+    claimed = set()
+    for chunk in in_chunks(order_ids):
+        if locking:
+            unlocked = {order_id for order_id, in sess.query(Order.order_id).filter(
+                Order.order_id.in_(chunk)).with_for_update(skip_locked=True)}
+            if skipped is not None:
+                skipped.update(order_id for order_id in chunk if order_id not in unlocked)
+            chunk = [order_id for order_id in chunk if order_id in unlocked]
+            if not chunk:
+                continue
+        updated = sess.query(Order).filter(Order.order_id.in_(chunk), Order.courier_id == None).update(
+            {Order.courier_id: courier_id, Order.assign_time: assign_time, Order.type_for_delivery: courier_type,
+             Order.delivery_id: delivery_id}, synchronize_session=False)
+        if updated == len(chunk):
+            claimed.update(chunk)
+        elif updated:
+            claimed.update(order_id for order_id, in sess.query(Order.order_id).filter(
+                Order.order_id.in_(chunk), Order.courier_id == courier_id, Order.assign_time == assign_time))
+    return claimed
+
+
+def release_orders(sess, order_ids):
+    """Отвязывает заказы order_ids от курьеров и развозов, по одному UPDATE на порцию id"""
+    for chunk in in_chunks(order_ids):
+        sess.query(Order).filter(Order.order_id.in_(chunk)).update(
+            {Order.courier_id: None, Order.assign_time: None, Order.type_for_delivery: None,
+             Order.delivery_id: None}, synchronize_session=False)
+
+
+def claim_from_pool(sess, profile, assign_time):
+    """Подбирает курьеру заказы из пула и захватывает их в текущей транзакции, возвращает id по возрастанию веса.
+
+    Заказы, которые уже забрал кто-то другой, убираются из пула, и к уже захваченным добираются следующие
+    кандидаты с учетом их веса: пул между попытками могут менять другие потоки, и повторный подбор
+    с нуля мог бы не выбрать заказы, уже привязанные в базе к этому развозу. Захваченные заказы
+    составляют новый развоз курьера.
+    """
+    delivery = Delivery(courier_id=profile.courier_id, courier_type=profile.courier_type, assign_time=assign_time,
+                        orders_count=0, completed_count=0)
+    sess.add(delivery)
+    sess.flush()
+    claimed, skipped = {}, set()
+    sum_weight = 0
+    while True:
+        with pool.lock:
+            fresh = pool.select(profile.regions, profile.hours_mask, profile.carrying, sum_weight, claimed.keys())
+            weights = {order_id: pool.orders[order_id].weight for order_id in fresh}
+        won = claim_orders(sess, fresh, profile.courier_id, assign_time, profile.courier_type, delivery.id, skipped)
+        for order_id in fresh:
+            if order_id in won:
+                claimed[order_id] = weights[order_id]
+                sum_weight += weights[order_id]
+        lost = [order_id for order_id in fresh if order_id not in won]
+        if not lost:
+            break
+        with pool.lock:
+            pool.remove_all(lost)
+            if skipped:
+                # чем закончится чужая транзакция с пропущенными заказами, неизвестно: пул перечитается
+                # из базы при следующем назначении
+                pool.state = None
+    chosen = sorted(claimed, key=lambda order_id: (claimed[order_id], order_id))
+    if chosen:
+        delivery.orders_count = len(chosen)
+    else:
+        sess.delete(delivery)
+    return chosen
+
+
+def pool_state(sess):
+    row = sess.query(PoolState.epoch, PoolState.version).filter(PoolState.id == 1).first()
+    return tuple(row) if row else NO_STATE
+
+
+def sync_pool(sess):
+    """Перечитывает пул процесса, если непривязанные заказы менял кто-то другой"""
+    state = pool_state(sess)
+    if pool.state == state:
+        return
+    # заказы читаются после состояния, поэтому они не старее его; пока идет запрос и загрузка,
+    # подбор в других потоках работает со старым содержимым пула
+    pool.load(load_candidates(sess, Order.courier_id == None), state)
+
+
+def bump_pool_state(sess):
+    """Увеличивает версию пула в текущей транзакции, возвращает (старое состояние, новое)"""
+    updated = sess.query(PoolState).filter(PoolState.id == 1).update(
+        {PoolState.version: PoolState.version + 1}, synchronize_session=False)
+    if updated:
+        epoch, version = pool_state(sess)
+        return (epoch, version - 1), (epoch, version)
+    epoch = uuid4().hex
+    sess.execute(PoolState.__table__.insert(), {'id': 1, 'epoch': epoch, 'version': 1})
+    return NO_STATE, (epoch, 1)
+
+
+def commit_pool_change(sess, change):
+    """Коммитит транзакцию, изменившую непривязанные заказы, и применяет change(pool) к пулу процесса.
+
+    Версия пула увеличивается в самой транзакции до lock: поток, который держит lock, может ждать
+    блокировку записи этой транзакции. Коммит и применение - под lock, чтобы изменения из потоков
+    процесса применялись в порядке их коммитов и пул не считался устаревшим из-за соседнего потока.
+    """
+    previous, state = bump_pool_state(sess)
+    with pool.lock:
+        sess.commit()
+        pool.apply(previous, state, change)
+
+
+def write_pool_change(work):
+    """Выполняет work(sess) через write и применяет к пулу процесса изменение непривязанных заказов.
+
+    work возвращает (результат, change), change(pool) - изменение пула или None, если заказы не менялись.
+    Версия пула увеличивается в той же транзакции, а change применяется после ее коммита под lock пула,
+    как в commit_pool_change. Возвращает результат work.
+    """
+    def run(sess):
+        result, change = work(sess)
+        if change is None:
+            return result, None
+        previous, state = bump_pool_state(sess)
+        return result, (previous, state, change)
+
+    def apply(outcome):
+        result, transition = outcome
+        if transition is not None:
+            pool.apply(*transition)
+
+    result, transition = write(run, lock=pool.lock, after_commit=apply)
+    return result
+
+
+def release_to_pool(sess, order_ids):
+    """Изменение пула для заказов order_ids, отвязанных от курьера в текущей транзакции (для write_pool_change)"""
+    candidates = []
+    for chunk in in_chunks(order_ids):
+        candidates.extend(load_candidates(sess, Order.order_id.in_(chunk)))
+    return lambda pool: pool.add_all(candidates)
@@ -0,0 +1,232 @@
+from abc import ABC, abstractmethod
+from itertools import islice
+
+from sqlalchemy.exc import IntegrityError
+
+from dispatch.engine import Candidate
+
+from .courier_cache import invalidate
+from .couriers import Courier
+from .couriers_type import courier_types
+from .db_session import begin_write, in_chunks
+from .dispatch_queries import commit_pool_change
+from .intervals import Interval
+from .intervals_delivery import IntervalDelivery
+from .orders import Order
+from .orders_regions import OrderRegion
+from .regions import Regions
+from .time_interval import hours_mask, pack_mask, parse_interval, unpack_mask
+
+VALIDATION_ERRORS = (ValueError, AssertionError, TypeError, IndexError)
+
+
+def find_existing(sess, column, values):
+    found = set()
+    for chunk in in_chunks(values):
+        found.update(value for value, in sess.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def chunked(items, size):
+    if size is None:
+        yield list(items)
+        return
+    items = iter(items)
+    chunk = list(islice(items, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(items, size))
+
+
+class BulkIngest(ABC):
+    """Пакетная загрузка: все проверки за один проход по данным и вставка через executemany.
+
+    Данные обрабатываются порциями по chunk_size элементов (None - все сразу). По умолчанию загрузка
+    атомарная: при первой ошибке вставка прекращается, остальные элементы только проверяются, и в конце
+    транзакция откатывается. В режиме partial каждая порция вставляется в своем savepoint и сразу
+    коммитится, ошибочные элементы просто пропускаются; если items обрывается ValueError (битый JSON
+    в потоке), уже прочитанные элементы все равно загружаются, а ошибка остается в stream_error.
+    """
+    model = None
+    id_key = None
+    keys = []
+    # таблицы в порядке вставки, validate возвращает строки для каждой из них
+    tables = []
+
+    def __init__(self, sess):
+        self.sess = sess
+        self.seen = set()
+        self.stream_error = None
+        self.parsed = 0
+
+    @abstractmethod
+    def validate(self, data):
+        """Строки для каждой из tables по одному элементу payload, при ошибке - исключение из VALIDATION_ERRORS"""
+
+    def check(self, items):
+        """Возвращает [(id, строки или None)] в порядке payload, None - элемент не прошел проверку"""
+        checked = []
+        for data in items:
+            item_id = data.get(self.id_key) if isinstance(data, dict) else None
+            try:
+                if not all(key in self.keys for key in data) or len(self.keys) != len(data):
+                    raise ValueError
+                assert isinstance(item_id, int) and item_id > 0 and item_id not in self.seen
+                rows = self.validate(data)
+            except VALIDATION_ERRORS:
+                checked.append((item_id, None))
+                continue
+            self.seen.add(item_id)
+            checked.append((item_id, rows))
+
+        id_column = getattr(self.model, self.id_key)
+        existing = find_existing(self.sess, id_column, [item_id for item_id, rows in checked if rows])
+        return [(item_id, rows if item_id not in existing else None) for item_id, rows in checked]
+
+    def insert(self, checked):
+        for i, table in enumerate(self.tables):
+            rows = [row for item_id, item_rows in checked for row in item_rows[i]]
+            if rows:
+                self.sess.execute(table.insert(), rows)
+
+    def insert_partial(self, checked):
+        """Вставляет порцию в savepoint, а если она не проходит целиком - по одному элементу"""
+        try:
+            with self.sess.begin_nested():
+                self.insert([(item_id, rows) for item_id, rows in checked if rows is not None])
+            return checked
+        except IntegrityError:
+            pass
+        result = []
+        for item_id, rows in checked:
+            if rows is not None:
+                try:
+                    with self.sess.begin_nested():
+                        self.insert([(item_id, rows)])
+                except IntegrityError:
+                    rows = None
+            result.append((item_id, rows))
+        return result
+
+    def commit(self):
+        self.sess.commit()
+
+    def rollback(self):
+        self.sess.rollback()
+
+    def read(self, items):
+        """Элементы items до первой ошибки разбора, ошибка запоминается в stream_error"""
+        try:
+            for data in items:
+                self.parsed += 1
+                yield data
+        except ValueError as error:
+            self.stream_error = error
+
+    def run(self, items, chunk_size=None, partial=False):
+        """Загружает элементы и коммитит результат. Возвращает (принятые id, ошибочные id)"""
+        created, invalid = [], []
+        if partial:
+            # закоммиченные порции уже не откатить, поэтому битый хвост не должен отменять ответ о них
+            items = self.read(items)
+        else:
+            begin_write(self.sess)
+        for chunk in chunked(items, chunk_size):
+            if partial:
+                # у каждой порции своя транзакция, проверка существующих id - уже в ней
+                begin_write(self.sess)
+            checked = self.check(chunk)
+            if partial:
+                checked = self.insert_partial(checked)
+                self.commit()
+            invalid.extend(item_id for item_id, rows in checked if rows is None)
+            if not partial:
+                if invalid:
+                    continue
+                self.insert(checked)
+            created.extend(item_id for item_id, rows in checked if rows is not None)
+
+        if invalid and not partial:
+            self.rollback()
+            return [], invalid
+        self.commit()
+        return created, invalid
+
+
+class CouriersIngest(BulkIngest):
+    model = Courier
+    id_key = 'courier_id'
+    keys = ['courier_id', 'courier_type', 'regions', 'working_hours']
+    tables = [Courier.__table__, Regions.__table__, Interval.__table__]
+
+    def __init__(self, sess):
+        super().__init__(sess)
+        # вставленные, но еще не закоммиченные курьеры: после коммита процесс забывает все, что помнил о таких id
+        self.pending = []
+
+    def insert(self, checked):
+        super().insert(checked)
+        self.pending.extend(item_id for item_id, rows in checked)
+
+    def commit(self):
+        super().commit()
+        courier_ids, self.pending = self.pending, []
+        invalidate(courier_ids)
+
+    def rollback(self):
+        self.pending = []
+        super().rollback()
+
+    def validate(self, data):
+        courier_id = data['courier_id']
+        assert isinstance(data['regions'], list) and isinstance(data['working_hours'], list)
+        assert isinstance(data['courier_type'], str) and data['courier_type'] in courier_types
+        regions = []
+        for region in data['regions']:
+            assert isinstance(region, int) and region > 0
+            regions.append({'courier_id': courier_id, 'region': region})
+        intervals = [parse_interval(hours) for hours in data['working_hours']]
+        # version явно: в базах, обновленных до того, как миграция стала переносить DEFAULT, его нет
+        return ([{'courier_id': courier_id, 'courier_type': data['courier_type'],
+                  'hours_mask': pack_mask(hours_mask(intervals)), 'version': 1}], regions,
+                [{'courier_id': courier_id, 'time_start': interval.time_start, 'time_stop': interval.time_stop}
+                 for interval in intervals])
+
+
+class OrdersIngest(BulkIngest):
+    model = Order
+    id_key = 'order_id'
+    keys = ['order_id', 'weight', 'region', 'delivery_hours']
+    tables = [Order.__table__, OrderRegion.__table__, IntervalDelivery.__table__]
+
+    def __init__(self, sess):
+        super().__init__(sess)
+        # вставленные, но еще не закоммиченные заказы, которые надо добавить в пул
+        self.pending = []
+
+    def insert(self, checked):
+        super().insert(checked)
+        for item_id, (orders, regions, intervals) in checked:
+            self.pending.append(Candidate(item_id, orders[0]['weight'], frozenset(row['region'] for row in regions),
+                                          unpack_mask(orders[0]['hours_mask'])))
+
+    def commit(self):
+        if not self.pending:
+            return super().commit()
+        candidates, self.pending = self.pending, []
+        commit_pool_change(self.sess, lambda pool: pool.add_all(candidates))
+
+    def rollback(self):
+        self.pending = []
+        super().rollback()
+
+    def validate(self, data):
+        order_id, weight, region = data['order_id'], data['weight'], data['region']
+        assert isinstance(data['delivery_hours'], list)
+        assert isinstance(weight, (float, int)) and 50 >= weight >= 0.01 and round(weight, 2) == weight
+        assert isinstance(region, int) and region > 0
+        intervals = [parse_interval(hours) for hours in data['delivery_hours']]
+        return ([{'order_id': order_id, 'weight': weight, 'hours_mask': pack_mask(hours_mask(intervals))}],
+                [{'order_id': order_id, 'region': region}],
+                [{'order_id': order_id, 'time_start': interval.time_start, 'time_stop': interval.time_stop}
+                 for interval in intervals])
@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, ForeignKey, Time
 from sqlalchemy.orm import relation, validates
 from .db_session import SqlAlchemyBase
-from datetime import datetime
+from .time_interval import TimeInterval, parse_interval
 
 
 class Interval(SqlAlchemyBase):
@@ -10,7 +10,7 @@ class Interval(SqlAlchemyBase):
     id = Column(Integer, primary_key=True, autoincrement=True)
     time_start = Column(Time, nullable=False)
     time_stop = Column(Time, nullable=False)
-    courier_id = Column(Integer, ForeignKey('couriers.courier_id'))
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), index=True)
 
     # здесь название класса, на который ссылаешься
     courier = relation('Courier')
@@ -18,27 +18,21 @@ class Interval(SqlAlchemyBase):
     @validates('time_start')
     def validate_time_start(self, key, value: str):
         assert isinstance(value, str)
-        value = value.split('-')
-        time_stop = datetime.strptime(value[1], '%H:%M')
-        time_start = datetime.strptime(value[0], '%H:%M')
-        assert time_stop > time_start
-        value = datetime.strptime(value[0], '%H:%M').time()
-        return value
+        return parse_interval(value).time_start
 
     @validates('time_stop')
     def validate_time_stop(self, key, value: str):
         assert isinstance(value, str)
-        value = value.split('-')
-        time_stop = datetime.strptime(value[1], '%H:%M')
-        time_start = datetime.strptime(value[0], '%H:%M')
-        assert time_stop > time_start
-        value = datetime.strptime(value[1], '%H:%M').time()
-        return value
+        return parse_interval(value).time_stop
 
     @validates('courier_id')
     def validate_courier_id(self, key, value):
         assert isinstance(value, int) and value > 0
         return value
 
+    @property
+    def interval(self) -> TimeInterval:
+        return TimeInterval.from_times(self.time_start, self.time_stop)
+
     def __str__(self):
-        return f'{self.time_start.strftime("%H:%M")}-{self.time_stop.strftime("%H:%M")}'
+        return str(self.interval)
@@ -1,9 +1,8 @@
-from datetime import datetime
-
 from sqlalchemy import Column, Integer, ForeignKey, Time
 from sqlalchemy.orm import relation, validates
 
 from .db_session import SqlAlchemyBase
+from .time_interval import TimeInterval, parse_interval
 
 
 class IntervalDelivery(SqlAlchemyBase):
@@ -12,7 +11,7 @@ class IntervalDelivery(SqlAlchemyBase):
     id = Column(Integer, primary_key=True, autoincrement=True)
     time_start = Column(Time, nullable=False)
     time_stop = Column(Time, nullable=False)
-    order_id = Column(Integer, ForeignKey('orders.order_id'))
+    order_id = Column(Integer, ForeignKey('orders.order_id'), index=True)
 
     # здесь название класса, на который ссылаешься
     order = relation('Order')
@@ -20,27 +19,21 @@ class IntervalDelivery(SqlAlchemyBase):
     @validates('time_start')
     def validate_time_start(self, key, value: str):
         assert isinstance(value, str)
-        value = value.split('-')
-        time_stop = datetime.strptime(value[1], '%H:%M')
-        time_start = datetime.strptime(value[0], '%H:%M')
-        assert time_stop > time_start
-        value = datetime.strptime(value[0], '%H:%M').time()
-        return value
+        return parse_interval(value).time_start
 
     @validates('time_stop')
     def validate_time_stop(self, key, value: str):
         assert isinstance(value, str)
-        value = value.split('-')
-        time_stop = datetime.strptime(value[1], '%H:%M')
-        time_start = datetime.strptime(value[0], '%H:%M')
-        assert time_stop > time_start
-        value = datetime.strptime(value[1], '%H:%M').time()
-        return value
+        return parse_interval(value).time_stop
 
     @validates('order_id')
     def validate_order_id(self, key, value):
         assert isinstance(value, int)
         return value
 
+    @property
+    def interval(self) -> TimeInterval:
+        return TimeInterval.from_times(self.time_start, self.time_stop)
+
     def __str__(self):
-        return f'{self.time_start.strftime("%H:%M")}-{self.time_stop.strftime("%H:%M")}'
+        return str(self.interval)
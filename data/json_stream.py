@@ -0,0 +1,95 @@
+import codecs
+import json
+
+READ_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayReader:
+    """Читает из потока объект вида {"<key>": [...]} и отдает элементы массива по одному.
+
+    В памяти держится только непрочитанный хвост буфера и текущий элемент, а не весь документ.
+    При некорректном JSON и данных после документа бросает ValueError - уже после отданных элементов.
+    """
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self.stream = stream
+        self.read_size = read_size
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        data = self.stream.read(self.read_size)
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + self.utf8.decode(data, final=self.eof)
+        self.pos = 0
+
+    def _skip_whitespace(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return
+            self._fill()
+
+    def _expect(self, chars):
+        self._skip_whitespace()
+        if self.pos >= len(self.buf) or self.buf[self.pos] not in chars:
+            raise ValueError(f'Ожидался один из символов {chars!r} на позиции {self.pos}')
+        self.pos += 1
+        return self.buf[self.pos - 1]
+
+    def _value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # число в конце буфера может продолжиться в следующем куске
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _finish(self):
+        """Дочитывает объект после массива: остальные ключи, закрывающую скобку и конец потока"""
+        while self._expect(',}') == ',':
+            if not isinstance(self._value(), str):
+                raise ValueError('Ключ объекта должен быть строкой')
+            self._expect(':')
+            self._value()
+        self._skip_whitespace()
+        if self.pos < len(self.buf):
+            raise ValueError(f'Лишние данные после документа на позиции {self.pos}')
+
+    def items(self, key):
+        self._expect('{')
+        self._skip_whitespace()
+        if self.buf[self.pos:self.pos + 1] == '}':
+            raise ValueError(f'Нет ключа {key!r}')
+        while True:
+            name = self._value()
+            if not isinstance(name, str):
+                raise ValueError('Ключ объекта должен быть строкой')
+            self._expect(':')
+            if name == key:
+                self._expect('[')
+                self._skip_whitespace()
+                if self.buf[self.pos:self.pos + 1] == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(',]') == ']':
+                            break
+                self._finish()
+                return
+            self._value()
+            if self._expect(',}') == '}':
+                raise ValueError(f'Нет ключа {key!r}')
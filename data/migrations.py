@@ -0,0 +1,99 @@
+import sqlalchemy as sa
+from sqlalchemy import orm
+from .courier_stats import CourierRegionStats, CourierStats
+from .couriers import Courier
+from .db_session import SqlAlchemyBase, in_chunks
+from .deliveries import Delivery
+from .intervals import Interval
+from .intervals_delivery import IntervalDelivery
+from .orders import Order
+from .stats_queries import rebuild_stats
+from .time_interval import TimeInterval, pack_mask
+
+
+def add_missing_indexes(engine):
+    """create_all не трогает уже существующие таблицы, поэтому индексы для старых баз добавляем сами"""
+    inspector = sa.inspect(engine)
+    for table in SqlAlchemyBase.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f'Создание индекса {index.name}')
+                index.create(engine)
+
+
+def add_missing_columns(engine):
+    inspector = sa.inspect(engine)
+    for table in SqlAlchemyBase.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                print(f'Добавление колонки {table.name}.{column.name}')
+                # определение колонки целиком, с DEFAULT и NOT NULL модели: без них строки, вставленные
+                # после миграции в обход ORM, получат NULL
+                definition = sa.schema.CreateColumn(column).compile(dialect=engine.dialect)
+                quote = engine.dialect.identifier_preparer.quote
+                engine.execute(f'ALTER TABLE {quote(table.name)} ADD COLUMN {definition}')
+
+
+def backfill_hours_masks(engine):
+    for model, id_column, interval_model, owner_column in (
+            (Courier, Courier.courier_id, Interval, Interval.courier_id),
+            (Order, Order.order_id, IntervalDelivery, IntervalDelivery.order_id)):
+        ids = [row_id for row_id, in engine.execute(sa.select([id_column]).where(model.hours_mask == None))]
+        if not ids:
+            continue
+        print(f'Заполнение {model.__tablename__}.hours_mask для {len(ids)} строк')
+        masks = dict.fromkeys(ids, 0)
+        for chunk in in_chunks(ids):
+            query = sa.select([owner_column, interval_model.time_start, interval_model.time_stop]).where(
+                owner_column.in_(chunk))
+            for row_id, time_start, time_stop in engine.execute(query):
+                masks[row_id] |= TimeInterval.from_times(time_start, time_stop).mask
+        engine.execute(model.__table__.update().where(id_column == sa.bindparam('row_id')),
+                       [{'row_id': row_id, 'hours_mask': pack_mask(mask)} for row_id, mask in masks.items()])
+
+
+def backfill_versions(engine):
+    engine.execute(Courier.__table__.update().where(Courier.version == None).values(version=1))
+
+
+def backfill_deliveries(engine):
+    """Развозы для заказов, назначенных до появления deliveries: одно назначение - одно время назначения"""
+    query = sa.select([Order.courier_id, Order.assign_time, Order.type_for_delivery, sa.func.count(Order.order_id),
+                       sa.func.count(Order.complete_time)]).where(
+        sa.and_(Order.courier_id != None, Order.delivery_id == None)).group_by(Order.courier_id, Order.assign_time)
+    groups = engine.execute(query).fetchall()
+    if not groups:
+        return
+    print(f'Заполнение deliveries для {len(groups)} развозов')
+    for courier_id, assign_time, courier_type, orders_count, completed_count in groups:
+        delivery_id, = engine.execute(Delivery.__table__.insert(), {
+            'courier_id': courier_id, 'courier_type': courier_type, 'assign_time': assign_time,
+            'orders_count': orders_count, 'completed_count': completed_count}).inserted_primary_key
+        engine.execute(Order.__table__.update().where(sa.and_(
+            Order.courier_id == courier_id, Order.assign_time == assign_time, Order.delivery_id == None)).values(
+            delivery_id=delivery_id))
+
+
+def backfill_courier_stats(engine):
+    """Статистика курьеров для базы, заказы в которой завершались до появления courier_stats"""
+    sess = orm.Session(bind=engine)
+    try:
+        if sess.query(CourierStats.courier_id).first() or sess.query(CourierRegionStats.courier_id).first() or \
+                not sess.query(Order.order_id).filter(Order.complete_time != None).first():
+            return
+        print('Заполнение статистики курьеров')
+        rebuild_stats(sess)
+    finally:
+        sess.close()
+
+
+def upgrade(engine):
+    """Приводит существующую базу к текущим моделям, повторный запуск ничего не меняет"""
+    add_missing_columns(engine)
+    add_missing_indexes(engine)
+    backfill_hours_masks(engine)
+    backfill_versions(engine)
+    backfill_deliveries(engine)
+    backfill_courier_stats(engine)
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, LargeBinary
 from sqlalchemy.orm import relation, validates
 from .couriers import Courier
-from .couriers_type import CourierType
+from .couriers_type import courier_types
 from .db_session import SqlAlchemyBase, create_session
 from datetime import datetime
 
@@ -11,21 +11,26 @@ class Order(SqlAlchemyBase):
 
     order_id = Column(Integer, primary_key=True, autoincrement=True)
     weight = Column(Float)
-    assign_time = Column(DateTime)
-    complete_time = Column(DateTime)
-    courier_id = Column(Integer, ForeignKey('couriers.courier_id'))
+    assign_time = Column(DateTime, index=True)
+    complete_time = Column(DateTime, index=True)
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), index=True)
+    delivery_id = Column(Integer, ForeignKey('deliveries.id'), index=True)
     type_for_delivery = Column(String)
+    # часы доставки минутной маской, см. data.time_interval.hours_mask
+    hours_mask = Column(LargeBinary)
 
     # 1 - название класса, который ссылается сюда, 2 - название этого класса
     regions = relation('OrderRegion', back_populates='order')
     intervals = relation('IntervalDelivery', back_populates='order')
     courier = relation('Courier')
+    delivery = relation('Delivery', back_populates='orders')
 
     @validates('order_id')
     def validate_order_id(self, key, value):
+        assert isinstance(value, int) and value > 0
         session = create_session()
-        ids = [order.order_id for order in session.query(Order).all()]
-        assert value not in ids and isinstance(value, int) and value > 0
+        with session.no_autoflush:
+            assert session.query(Order.order_id).filter(Order.order_id == value).first() is None
         return value
 
     @validates('weight')
@@ -45,14 +50,15 @@ class Order(SqlAlchemyBase):
 
     @validates('courier_id')
     def validate_courier_id(self, key, value):
+        if value is None:
+            return value
+        assert isinstance(value, int)
         session = create_session()
-        ids = [courier.courier_id for courier in session.query(Courier).all()]
-        assert (value in ids and isinstance(value, int)) or value is None
+        with session.no_autoflush:
+            assert session.query(Courier.courier_id).filter(Courier.courier_id == value).first() is not None
         return value
 
     @validates('type_for_delivery')
     def validate_courier_type(self, key, value):
-        session = create_session()
-        types = [courier_type.type for courier_type in session.query(CourierType).all()]
-        assert value in types or value is None
+        assert value in courier_types or value is None
         return value
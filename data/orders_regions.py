@@ -8,10 +8,10 @@ class OrderRegion(SqlAlchemyBase):
     __tablename__ = 'orders_regions'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    region = Column(Integer, nullable=False)
+    region = Column(Integer, nullable=False, index=True)
 
     # здесь название таблицы на которую ссылаешься
-    order_id = Column(Integer, ForeignKey('orders.order_id'))
+    order_id = Column(Integer, ForeignKey('orders.order_id'), index=True)
     # здесь название класса, на который ссылаешься
     order = relation('Order')
 
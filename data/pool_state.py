@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Integer
+from .db_session import SqlAlchemyBase
+
+
+class PoolState(SqlAlchemyBase):
+    """Версия множества непривязанных заказов.
+
+    Увеличивается в той же транзакции, что и любое изменение этого множества, чтобы каждый процесс
+    мог дешево понять, актуален ли его dispatch.pool. epoch меняется при пересоздании строки.
+    """
+    __tablename__ = 'pool_state'
+
+    id = Column(Integer, primary_key=True)
+    epoch = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
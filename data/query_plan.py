@@ -0,0 +1,64 @@
+"""EXPLAIN QUERY PLAN для горячих запросов: python -m data.query_plan [файл базы]"""
+import sys
+
+from . import db_session
+from .courier_stats import CourierRegionStats, CourierStats
+from .couriers import Courier
+from .deliveries import Delivery
+from .intervals import Interval
+from .intervals_delivery import IntervalDelivery
+from .orders import Order
+from .orders_regions import OrderRegion
+from .regions import Regions
+
+
+def hot_queries(sess):
+    return {
+        'courier': sess.query(Courier).filter(Courier.courier_id == 1),
+        'courier regions': sess.query(Regions).filter(Regions.courier_id == 1),
+        'courier working hours': sess.query(Interval).filter(Interval.courier_id == 1),
+        'unassigned orders': sess.query(Order).filter(Order.courier_id == None),
+        'unassigned order regions': sess.query(Order.order_id, Order.weight, OrderRegion.region).join(
+            OrderRegion, OrderRegion.order_id == Order.order_id).filter(Order.courier_id == None),
+        'unassigned order delivery hours': sess.query(IntervalDelivery).join(
+            Order, Order.order_id == IntervalDelivery.order_id).filter(Order.courier_id == None),
+        'active orders': sess.query(Order).filter(Order.courier_id == 1, Order.complete_time == None),
+        'completed orders': sess.query(Order).filter(Order.courier_id == 1, Order.complete_time != None),
+        'order regions': sess.query(OrderRegion).filter(OrderRegion.order_id == 1),
+        'orders in region': sess.query(OrderRegion).filter(OrderRegion.region == 1),
+        'order delivery hours': sess.query(IntervalDelivery).filter(IntervalDelivery.order_id == 1),
+        'delivery': sess.query(Delivery).filter(Delivery.id == 1),
+        'delivery orders': sess.query(Order.order_id).filter(Order.delivery_id == 1),
+        'courier stats': sess.query(CourierStats).filter(CourierStats.courier_id == 1),
+        'courier region stats': sess.query(CourierRegionStats).filter(
+            CourierRegionStats.courier_id == 1, CourierRegionStats.region == 1),
+    }
+
+
+def explain(sess, query):
+    compiled = query.statement.compile(dialect=sess.bind.dialect)
+    params = [compiled.params[name] for name in compiled.positiontup]
+    rows = sess.connection().execute('EXPLAIN QUERY PLAN ' + str(compiled), *params)
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    return [step for step in plan if step.startswith('SCAN') and 'USING' not in step]
+
+
+def main():
+    db_session.global_init(sys.argv[1] if len(sys.argv) > 1 else 'db/base.db')
+    sess = db_session.create_session()
+    scans = 0
+    for name, query in hot_queries(sess).items():
+        plan = explain(sess, query)
+        scans += len(full_scans(plan))
+        print(f'{name}:')
+        for step in plan:
+            print(f'    {step}')
+    print('Полных просмотров таблиц нет' if not scans else f'Полных просмотров таблиц: {scans}')
+    return 1 if scans else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,7 +10,7 @@ class Regions(SqlAlchemyBase):
     id = Column(Integer, primary_key=True, autoincrement=True)
     region = Column(Integer, nullable=False)
     # здесь название таблицы на которую ссылаешься
-    courier_id = Column(Integer, ForeignKey('couriers.courier_id'))
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), index=True)
 
     # здесь название класса, на который ссылаешься
     courier = relation('Courier')
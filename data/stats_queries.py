@@ -0,0 +1,193 @@
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import func
+
+from .courier_stats import CourierStats, CourierRegionStats
+from .couriers import Courier
+from .couriers_type import CourierType, courier_types
+from .db_session import begin_write, in_chunks
+from .deliveries import Delivery
+from .orders import Order
+from .orders_regions import OrderRegion
+
+# оплата одного завершенного развоза до умножения на коэффициент типа курьера
+DELIVERY_PAYMENT = 500
+
+REGION_FIELDS = ('orders_count', 'delivery_us', 'first_order_id', 'first_complete_time', 'first_assign_time',
+                 'last_complete_time')
+
+
+def microseconds(delta):
+    return delta // timedelta(microseconds=1)
+
+
+def courier_stats(sess, courier_id):
+    stats = sess.query(CourierStats).filter(CourierStats.courier_id == courier_id).first()
+    if stats is None:
+        stats = CourierStats(courier_id=courier_id, completed_deliveries=0, earnings=0)
+        sess.add(stats)
+    return stats
+
+
+def count_delivery(sess, courier_id, courier_type):
+    stats = courier_stats(sess, courier_id)
+    stats.completed_deliveries += 1
+    stats.earnings += DELIVERY_PAYMENT * courier_types[courier_type].coefficient
+
+
+def record_completions(sess, orders):
+    """Учитывает завершение заказов в статистике курьеров в текущей транзакции.
+
+    orders - объекты с order_id, courier_id, assign_time, complete_time и delivery_id, районы, строки
+    статистики и развозы читаются пачкой. Вызывается после lock_couriers: иначе два параллельных
+    завершения одного курьера перезапишут суммы друг друга или оба посчитают последний заказ развоза.
+    """
+    order_regions = {}
+    for chunk in in_chunks([order.order_id for order in orders]):
+        for order_id, region in sess.query(OrderRegion.order_id, OrderRegion.region).filter(
+                OrderRegion.order_id.in_(chunk)):
+            order_regions.setdefault(order_id, []).append(region)
+    rows = {}
+    for chunk in in_chunks({order.courier_id for order in orders}):
+        for row in sess.query(CourierRegionStats).filter(CourierRegionStats.courier_id.in_(chunk)):
+            rows[row.courier_id, row.region] = row
+
+    for order in orders:
+        for region in order_regions.get(order.order_id, []):
+            row = rows.get((order.courier_id, region))
+            if row is None:
+                row = rows[order.courier_id, region] = CourierRegionStats(
+                    courier_id=order.courier_id, region=region, orders_count=0, first_order_id=order.order_id,
+                    first_complete_time=order.complete_time, first_assign_time=order.assign_time,
+                    last_complete_time=order.complete_time)
+                sess.add(row)
+            elif (order.complete_time, order.order_id) < (row.first_complete_time, row.first_order_id):
+                row.first_order_id = order.order_id
+                row.first_complete_time = order.complete_time
+                row.first_assign_time = order.assign_time
+            row.last_complete_time = max(row.last_complete_time, order.complete_time)
+            row.orders_count += 1
+            row.delivery_us = microseconds(row.last_complete_time - row.first_assign_time)
+
+    completed = Counter(order.delivery_id for order in orders)
+    for chunk in in_chunks(completed):
+        for delivery in sess.query(Delivery).filter(Delivery.id.in_(chunk)):
+            delivery.completed_count += completed[delivery.id]
+            if delivery.finished:
+                count_delivery(sess, delivery.courier_id, delivery.courier_type)
+
+
+def record_release(sess, delivery, released):
+    """Учитывает снятие released заказов с развоза: он может на этом завершиться или опустеть"""
+    delivery.orders_count -= released
+    if delivery.finished:
+        count_delivery(sess, delivery.courier_id, delivery.courier_type)
+    elif not delivery.orders_count:
+        sess.delete(delivery)
+
+
+def rating(av_times):
+    """Рейтинг по самому быстрому району: 5 за мгновенную доставку, 0 за час и дольше"""
+    if not av_times:
+        return 0
+    min_t = min(av_times)
+    return (3600 - min(min_t, 3600)) / 3600 * 5
+
+
+def courier_summary(sess, courier_id):
+    """(рейтинг, завершенных развозов, заработок) из накопленной статистики"""
+    stats = sess.query(CourierStats.completed_deliveries, CourierStats.earnings).filter(
+        CourierStats.courier_id == courier_id).first()
+    av_times = [delivery_us / 10 ** 6 / orders_count for delivery_us, orders_count in sess.query(
+        CourierRegionStats.delivery_us, CourierRegionStats.orders_count).filter(
+        CourierRegionStats.courier_id == courier_id)]
+    completed_deliveries, earnings = stats if stats else (0, 0)
+    return rating(av_times), completed_deliveries, earnings
+
+
+def delivery_counts(sess):
+    """Заказы развозов по самим заказам: {delivery_id: (заказов, завершено)}"""
+    return {delivery_id: (orders_count, completed_count) for delivery_id, orders_count, completed_count in sess.query(
+        Order.delivery_id, func.count(Order.order_id), func.count(Order.complete_time)).filter(
+        Order.delivery_id != None).group_by(Order.delivery_id)}
+
+
+def computed_stats(sess):
+    """Статистика, посчитанная заново по заказам.
+
+    ({delivery_id: (заказов, завершено)}, {courier_id: (развозов, заработок)}, {(courier_id, район): поля})
+    """
+    counts = delivery_counts(sess)
+    # коэффициенты из той же базы, а не из реестра процесса: миграция пересчитывает и чужую базу
+    coefficients = dict(sess.query(CourierType.type, CourierType.coefficient))
+    deliveries = {}
+    for delivery_id, courier_id, courier_type in sess.query(Delivery.id, Delivery.courier_id, Delivery.courier_type):
+        orders_count, completed_count = counts.get(delivery_id, (0, 0))
+        if completed_count == orders_count > 0:
+            count, earnings = deliveries.get(courier_id, (0, 0))
+            deliveries[courier_id] = (count + 1, earnings + DELIVERY_PAYMENT * coefficients[courier_type])
+
+    partition = (Order.courier_id, OrderRegion.region)
+    ranked = sess.query(
+        Order.courier_id, OrderRegion.region, Order.order_id, Order.complete_time, Order.assign_time,
+        func.row_number().over(partition_by=partition, order_by=(Order.complete_time, Order.order_id)).label('rank'),
+        func.count().over(partition_by=partition).label('orders_count'),
+        func.max(Order.complete_time).over(partition_by=partition).label('last_complete_time')).join(
+        OrderRegion, OrderRegion.order_id == Order.order_id).filter(
+        Order.courier_id != None, Order.complete_time != None).subquery()
+    regions = {}
+    for courier_id, region, order_id, complete_time, assign_time, _, orders_count, last_complete_time in sess.query(
+            ranked).filter(ranked.c.rank == 1):
+        regions[courier_id, region] = (orders_count, microseconds(last_complete_time - assign_time), order_id,
+                                       complete_time, assign_time, last_complete_time)
+    return counts, deliveries, regions
+
+
+def stored_stats(sess):
+    counts = {delivery_id: (orders_count, completed_count) for delivery_id, orders_count, completed_count in sess.query(
+        Delivery.id, Delivery.orders_count, Delivery.completed_count) if orders_count}
+    deliveries = {courier_id: (count, earnings) for courier_id, count, earnings in sess.query(
+        CourierStats.courier_id, CourierStats.completed_deliveries, CourierStats.earnings)}
+    regions = {(row.courier_id, row.region): tuple(getattr(row, field) for field in REGION_FIELDS)
+               for row in sess.query(CourierRegionStats)}
+    return counts, deliveries, regions
+
+
+def stats_differences(stored, computed):
+    """Ключи, по которым накопленная статистика расходится с посчитанной заново"""
+    return {name: sorted(key for key in set(stored_part) | set(computed_part)
+                         if stored_part.get(key) != computed_part.get(key))
+            for name, stored_part, computed_part in zip(('deliveries', 'couriers', 'regions'), stored, computed)}
+
+
+def rebuild_stats(sess):
+    """Пересчитывает статистику всех курьеров по заказам и коммитит, возвращает найденные расхождения.
+
+    Версии курьеров с исправленной статистикой увеличиваются в той же транзакции: по ним строятся ETag
+    и кэш ответов GET /couriers/<id>.
+    """
+    # пересчет и запись - одна пишущая транзакция, завершения заказов ждут ее конца
+    begin_write(sess)
+    computed = computed_stats(sess)
+    differences = stats_differences(stored_stats(sess), computed)
+    changed = set(differences['couriers']) | {courier_id for courier_id, region in differences['regions']}
+    for chunk in in_chunks(sorted(changed)):
+        sess.query(Courier).filter(Courier.courier_id.in_(chunk)).update(
+            {Courier.version: Courier.version + 1}, synchronize_session=False)
+    counts, deliveries, regions = computed
+    for delivery_id in differences['deliveries']:
+        orders_count, completed_count = counts.get(delivery_id, (0, 0))
+        sess.query(Delivery).filter(Delivery.id == delivery_id).update(
+            {Delivery.orders_count: orders_count, Delivery.completed_count: completed_count},
+            synchronize_session=False)
+    sess.query(CourierStats).delete(synchronize_session=False)
+    sess.query(CourierRegionStats).delete(synchronize_session=False)
+    sess.bulk_insert_mappings(CourierStats, [
+        {'courier_id': courier_id, 'completed_deliveries': count, 'earnings': earnings}
+        for courier_id, (count, earnings) in deliveries.items()])
+    sess.bulk_insert_mappings(CourierRegionStats, [
+        dict(zip(REGION_FIELDS, values), courier_id=courier_id, region=region)
+        for (courier_id, region), values in regions.items()])
+    sess.commit()
+    return differences
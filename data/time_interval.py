@@ -0,0 +1,75 @@
+import re
+from collections import namedtuple
+from datetime import time
+from functools import lru_cache
+
+# 1440 минут суток, по биту на минуту
+MASK_BYTES = 180
+# то же, что принимает datetime.strptime(value, '%H:%M')
+TIME_RE = re.compile(r'(2[0-3]|[0-1]\d|\d):([0-5]\d|\d)', re.IGNORECASE)
+
+
+class TimeInterval(namedtuple('TimeInterval', ['start', 'stop'])):
+    """Интервал внутри суток, start и stop - минуты от полуночи"""
+    __slots__ = ()
+
+    @classmethod
+    def from_times(cls, time_start, time_stop):
+        return cls(time_start.hour * 60 + time_start.minute, time_stop.hour * 60 + time_stop.minute)
+
+    @property
+    def time_start(self):
+        return time(*divmod(self.start, 60))
+
+    @property
+    def time_stop(self):
+        return time(*divmod(self.stop, 60))
+
+    @property
+    def mask(self):
+        """Минуты [start, stop) как биты числа, интервалы пересекаются ровно тогда, когда AND масок не 0"""
+        return (1 << self.stop) - (1 << self.start)
+
+    def overlaps(self, other):
+        return self.stop > other.start and other.stop > self.start
+
+    def __str__(self):
+        return f'{self.start // 60:02d}:{self.start % 60:02d}-{self.stop // 60:02d}:{self.stop % 60:02d}'
+
+
+def parse_minutes(value):
+    match = TIME_RE.fullmatch(value)
+    if match is None:
+        raise ValueError(f'Некорректное время {value!r}')
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+@lru_cache(maxsize=1024)
+def _parse_interval(value):
+    parts = value.split('-')
+    start, stop = parse_minutes(parts[0]), parse_minutes(parts[1])
+    if stop <= start:
+        raise ValueError(f'Интервал {value!r} заканчивается раньше, чем начинается')
+    return TimeInterval(start, stop)
+
+
+def parse_interval(value):
+    """Разбирает строку вида "HH:MM-HH:MM", повторяющиеся строки берутся из кэша"""
+    if not isinstance(value, str):
+        raise TypeError(f'Интервал должен быть строкой, а не {type(value).__name__}')
+    return _parse_interval(value)
+
+
+def hours_mask(intervals):
+    mask = 0
+    for interval in intervals:
+        mask |= interval.mask
+    return mask
+
+
+def pack_mask(mask):
+    return mask.to_bytes(MASK_BYTES, 'big')
+
+
+def unpack_mask(data):
+    return int.from_bytes(data, 'big') if data else 0
@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+from .trimming import heaviest_first
+
+# regions - множество районов заказа, hours_mask - минутная маска часов доставки (data.time_interval.hours_mask)
+Candidate = namedtuple('Candidate', ['order_id', 'weight', 'regions', 'hours_mask'])
+
+
+def by_weight(candidates):
+    return sorted(candidates, key=lambda candidate: (candidate.weight, candidate.order_id))
+
+
+def suits(candidate, regions, hours_mask):
+    return candidate.hours_mask & hours_mask and not candidate.regions.isdisjoint(regions)
+
+
+def select_orders(candidates, regions, hours_mask, carrying, sum_weight=0):
+    """Жадно набирает заказы для курьера, начиная с самых легких.
+
+    candidates должны быть отсортированы по весу (by_weight), regions - районы курьера,
+    hours_mask - маска его рабочих часов. Возвращает id выбранных заказов в порядке выбора.
+    """
+    chosen = []
+    for candidate in candidates:
+        # дальше заказы только тяжелее, в грузоподъемность они уже не поместятся
+        if sum_weight + candidate.weight > carrying:
+            break
+        if suits(candidate, regions, hours_mask):
+            chosen.append(candidate.order_id)
+            sum_weight += candidate.weight
+    return chosen
+
+
+def overflow(candidates, regions, hours_mask, carrying, trim=heaviest_first):
+    """Заказы курьера, которые после изменения его данных надо снять, id в порядке снятия.
+
+    Сначала снимаются заказы, которые не подходят по районам или часам, а если остальные не помещаются
+    в грузоподъемность - те, что выберет стратегия trim (см. dispatch.trimming).
+    """
+    dropped = [candidate.order_id for candidate in candidates if not suits(candidate, regions, hours_mask)]
+    kept = [candidate for candidate in candidates if suits(candidate, regions, hours_mask)]
+    return dropped + trim(kept, carrying)
@@ -0,0 +1,138 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from data.time_interval import MASK_BYTES
+
+available = np is not None
+
+
+def mask_runs(mask):
+    """Раскладывает минутную маску на непрерывные отрезки [start, stop)"""
+    runs = []
+    while mask:
+        low = mask & -mask
+        start = low.bit_length() - 1
+        # прибавление младшего бита обнуляет весь отрезок и ставит бит сразу за ним
+        carried = mask + low
+        runs.append((start, (carried & -carried).bit_length() - 1))
+        mask &= carried
+    return runs
+
+
+def minutes_prefix(mask):
+    """prefix[m] - сколько минут маски меньше m, отрезок [s, t) пересекается с маской, если prefix[t] > prefix[s]"""
+    bits = np.unpackbits(np.frombuffer(mask.to_bytes(MASK_BYTES, 'big'), dtype=np.uint8))[::-1]
+    prefix = np.zeros(len(bits) + 1, dtype=np.int32)
+    np.cumsum(bits, out=prefix[1:])
+    return prefix
+
+
+class ColumnBlock:
+    """Заказы одного района столбцами: id, вес и отрезки часов доставки, дополненные пустыми (0, 0).
+
+    Удаленные строки только помечаются в live и вычищаются, когда их становится больше половины,
+    новые копятся в pending и дописываются в массивы перед подбором.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.pending = []
+        self.dead = 0
+        self.order_id = np.empty(0, dtype=np.int64)
+        self.weight = np.empty(0, dtype=np.float64)
+        self.starts = np.empty((0, 1), dtype=np.int16)
+        self.stops = np.empty((0, 1), dtype=np.int16)
+        self.live = np.empty(0, dtype=bool)
+
+    def add(self, order_id, weight, runs):
+        self.rows[order_id] = len(self.order_id) + len(self.pending)
+        self.pending.append((order_id, weight, runs))
+
+    def remove(self, order_id):
+        row = self.rows.pop(order_id)
+        if row < len(self.order_id):
+            self.live[row] = False
+        else:
+            self.pending[row - len(self.order_id)] = None
+        self.dead += 1
+
+    def flush(self):
+        if self.pending:
+            pending, self.pending = self.pending, []
+            width = max([self.starts.shape[1]] + [len(row[2]) for row in pending if row is not None])
+            starts = np.zeros((len(pending), width), dtype=np.int16)
+            stops = np.zeros((len(pending), width), dtype=np.int16)
+            for i, row in enumerate(pending):
+                for j, (start, stop) in enumerate(row[2] if row is not None else ()):
+                    starts[i, j], stops[i, j] = start, stop
+            self.order_id = np.concatenate([self.order_id, [row[0] if row else 0 for row in pending]])
+            self.weight = np.concatenate([self.weight, [row[1] if row else 0 for row in pending]])
+            self.starts = np.concatenate([self.widen(self.starts, width), starts])
+            self.stops = np.concatenate([self.widen(self.stops, width), stops])
+            self.live = np.concatenate([self.live, [row is not None for row in pending]])
+        if self.dead * 2 > len(self.order_id):
+            self.compact()
+
+    @staticmethod
+    def widen(column, width):
+        if column.shape[1] == width:
+            return column
+        return np.pad(column, ((0, 0), (0, width - column.shape[1])))
+
+    def compact(self):
+        keep = np.flatnonzero(self.live)
+        for name in ('order_id', 'weight', 'starts', 'stops', 'live'):
+            setattr(self, name, getattr(self, name)[keep])
+        self.dead = 0
+        self.rows = {order_id: row for row, order_id in enumerate(self.order_id.tolist())}
+
+    def eligible(self, prefix):
+        """Строки, часы доставки которых пересекаются с маской курьера (prefix из minutes_prefix)"""
+        self.flush()
+        return self.live & (prefix[self.stops] > prefix[self.starts]).any(axis=1)
+
+
+class OrderColumns:
+    """Столбцовое представление пула для векторного подбора заказов (нужен numpy), по блоку на район"""
+
+    def __init__(self):
+        self.blocks = {}
+
+    def add(self, candidate):
+        runs = mask_runs(candidate.hours_mask)
+        for region in candidate.regions:
+            block = self.blocks.get(region)
+            if block is None:
+                block = self.blocks[region] = ColumnBlock()
+            block.add(candidate.order_id, candidate.weight, runs)
+
+    def remove(self, candidate):
+        for region in candidate.regions:
+            self.blocks[region].remove(candidate.order_id)
+
+    def flush(self):
+        for block in self.blocks.values():
+            block.flush()
+
+    def select(self, regions, hours_mask, carrying, sum_weight=0):
+        """То же, что dispatch.engine.select_orders по заказам пула, но векторно по каждому району"""
+        prefix = minutes_prefix(hours_mask)
+        order_ids, weights = [], []
+        for region in regions:
+            block = self.blocks.get(region)
+            if block is not None:
+                eligible = block.eligible(prefix)
+                order_ids.append(block.order_id[eligible])
+                weights.append(block.weight[eligible])
+        if not order_ids:
+            return []
+        # заказ из нескольких районов курьера подходит в нескольких блоках
+        order_ids, first = np.unique(np.concatenate(order_ids), return_index=True)
+        weights = np.concatenate(weights)[first]
+        order = np.lexsort((order_ids, weights))
+        # суммы накапливаются по одной, как в цикле select_orders, поэтому округление совпадает
+        sums = np.cumsum(np.concatenate([[sum_weight], weights[order]]))[1:]
+        count = np.searchsorted(sums, carrying, side='right')
+        return order_ids[order[:count]].tolist()
@@ -0,0 +1,127 @@
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import islice
+from threading import RLock
+
+from . import kernel
+from .engine import select_orders
+
+# цикл просматривает не больше max(SCAN_LIMIT, заказов в районах курьера / SCAN_SHARE) самых легких заказов,
+# прежде чем перейти на kernel.OrderColumns, векторный проход по району стоит примерно как цикл по его двадцатой части
+SCAN_LIMIT = 1000
+SCAN_SHARE = 20
+
+
+class OrderPool:
+    """Непривязанные заказы процесса, разложенные по районам и отсортированные по весу внутри района.
+
+    state - версия пула в базе (см. data.pool_state), которой соответствует содержимое; None - пул
+    устарел и должен быть перечитан. Читать и менять пул можно только под lock.
+    Если установлен numpy, пул дополнительно хранится столбцами в columns.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.state = None
+        self.orders = {}
+        self.buckets = {}
+        self.columns = kernel.OrderColumns() if kernel.available else None
+
+    def load(self, candidates, state):
+        """Заменяет содержимое пула. Новое содержимое собирается без lock, под lock только подменяется"""
+        orders = {}
+        buckets = {}
+        columns = kernel.OrderColumns() if self.columns is not None else None
+        for candidate in candidates:
+            orders[candidate.order_id] = candidate
+            if columns is not None:
+                columns.add(candidate)
+            for region in candidate.regions:
+                buckets.setdefault(region, []).append((candidate.weight, candidate.order_id))
+        # при полной загрузке сортируем районы один раз вместо вставки каждого заказа
+        for bucket in buckets.values():
+            bucket.sort()
+        if columns is not None:
+            columns.flush()
+        with self.lock:
+            self.orders, self.buckets, self.columns, self.state = orders, buckets, columns, state
+
+    def add(self, candidate):
+        if candidate.order_id in self.orders:
+            self.remove(candidate.order_id)
+        self.orders[candidate.order_id] = candidate
+        if self.columns is not None:
+            self.columns.add(candidate)
+        for region in candidate.regions:
+            insort(self.buckets.setdefault(region, []), (candidate.weight, candidate.order_id))
+
+    def remove(self, order_id):
+        candidate = self.orders.pop(order_id, None)
+        if candidate is None:
+            return
+        if self.columns is not None:
+            self.columns.remove(candidate)
+        for region in candidate.regions:
+            bucket = self.buckets[region]
+            del bucket[bisect_left(bucket, (candidate.weight, candidate.order_id))]
+            if not bucket:
+                del self.buckets[region]
+
+    def add_all(self, candidates):
+        for candidate in candidates:
+            self.add(candidate)
+
+    def remove_all(self, order_ids):
+        for order_id in order_ids:
+            self.remove(order_id)
+
+    def candidates(self, regions):
+        """Заказы из районов regions по возрастанию веса, как их ждет dispatch.engine.select_orders"""
+        last = None
+        for weight, order_id in merge(*(self.buckets.get(region, ()) for region in regions)):
+            # заказ из нескольких районов курьера встречается в слиянии несколько раз подряд
+            if order_id != last:
+                last = order_id
+                yield self.orders[order_id]
+
+    def select(self, regions, hours_mask, carrying, sum_weight=0, exclude=frozenset()):
+        """Подбирает заказы для курьера по правилам dispatch.engine.select_orders, кроме заказов из exclude"""
+        with self.lock:
+            if exclude:
+                # добор к уже захваченным заказам бывает только после проигранного захвата, хватает цикла
+                candidates = (candidate for candidate in self.candidates(regions)
+                              if candidate.order_id not in exclude)
+                return select_orders(candidates, regions, hours_mask, carrying, sum_weight)
+            if self.columns is None:
+                return select_orders(self.candidates(regions), regions, hours_mask, carrying, sum_weight)
+            # обычно курьер заполняется первыми легкими заказами и цикл быстрее, векторный проход
+            # нужен, когда подходящих по времени заказов мало и цикл просматривает весь район
+            limit = max(SCAN_LIMIT, sum(len(self.buckets.get(region, ())) for region in regions) // SCAN_SHARE)
+            scanned = []
+            chosen = select_orders(self.scan(regions, limit, scanned), regions, hours_mask, carrying, sum_weight)
+            if len(scanned) < limit or self.filled(chosen, scanned[-1], carrying, sum_weight):
+                return chosen
+            return self.columns.select(regions, hours_mask, carrying, sum_weight)
+
+    def scan(self, regions, limit, scanned):
+        for candidate in islice(self.candidates(regions), limit):
+            scanned.append(candidate)
+            yield candidate
+
+    def filled(self, chosen, last, carrying, sum_weight):
+        """Не влезет ли после выбранных заказов заказ тяжелее last, то есть ни один из непросмотренных"""
+        for order_id in chosen:
+            sum_weight += self.orders[order_id].weight
+        return sum_weight + last.weight > carrying
+
+    def apply(self, previous, state, change):
+        """Применяет к пулу свое изменение, закоммиченное в базе как переход previous -> state"""
+        with self.lock:
+            if self.state is not None and self.state == previous:
+                change(self)
+                self.state = state
+            else:
+                self.state = None
+
+
+pool = OrderPool()
@@ -0,0 +1,77 @@
+"""Какие заказы снять с курьера, если их общий вес больше его грузоподъемности.
+
+Стратегия получает подходящие курьеру незавершенные заказы (Candidate) и грузоподъемность,
+возвращает id снимаемых заказов в порядке снятия.
+"""
+from functools import partial
+from time import perf_counter
+
+# веса заказов заданы с точностью до сотых
+WEIGHT_SCALE = 100
+# сколько по умолчанию может считать точная стратегия, прежде чем перейти на жадную
+TIME_LIMIT = 0.05
+
+
+def heaviest_first(candidates, carrying):
+    """Снимает заказы, начиная с самых тяжелых, пока остальные не поместятся"""
+    dropped = []
+    sum_weight = sum(candidate.weight for candidate in candidates)
+    for candidate in sorted(candidates, key=lambda candidate: (-candidate.weight, candidate.order_id)):
+        if sum_weight <= carrying:
+            break
+        sum_weight -= candidate.weight
+        dropped.append(candidate.order_id)
+    return dropped
+
+
+def first_fit(candidates, carrying):
+    """Оставляет заказы от тяжелых к легким, пока они помещаются, остальные снимает"""
+    dropped = []
+    sum_weight = 0
+    for candidate in sorted(candidates, key=lambda candidate: (-candidate.weight, candidate.order_id)):
+        if sum_weight + candidate.weight <= carrying:
+            sum_weight += candidate.weight
+        else:
+            dropped.append(candidate.order_id)
+    return dropped
+
+
+def max_weight(candidates, carrying, time_limit=TIME_LIMIT):
+    """Оставляет набор заказов наибольшего веса, который помещается в грузоподъемность.
+
+    Рюкзак по весам в сотых долях: reachable[i] - битовая маска весов, которые можно набрать
+    из первых i заказов. Если расчет не укладывается в time_limit секунд, заказы снимаются first_fit.
+    """
+    if sum(candidate.weight for candidate in candidates) <= carrying:
+        return []
+    deadline = perf_counter() + time_limit
+    capacity = round(carrying * WEIGHT_SCALE)
+    limit = (1 << capacity + 1) - 1
+    ordered = sorted(candidates, key=lambda candidate: (-candidate.weight, candidate.order_id))
+    weights = [round(candidate.weight * WEIGHT_SCALE) for candidate in ordered]
+    reachable = [1]
+    for weight in weights:
+        if perf_counter() > deadline:
+            return first_fit(candidates, carrying)
+        reachable.append((reachable[-1] | reachable[-1] << weight) & limit)
+
+    total = reachable[-1].bit_length() - 1
+    kept = set()
+    # восстанавливаем набор с конца: заказ берется, только если без него вес total не набрать
+    for i in range(len(ordered), 0, -1):
+        if not reachable[i - 1] >> total & 1:
+            kept.add(i - 1)
+            total -= weights[i - 1]
+    return [candidate.order_id for i, candidate in enumerate(ordered) if i not in kept]
+
+
+STRATEGIES = {'heaviest': heaviest_first, 'knapsack': max_weight}
+
+
+def strategy(name, time_limit=TIME_LIMIT):
+    """Стратегия по имени из config.TRIM_STRATEGY, time_limit - предел времени точного расчета"""
+    if name not in STRATEGIES:
+        raise ValueError(f'Неизвестная стратегия снятия заказов {name!r}, есть: {", ".join(STRATEGIES)}')
+    if STRATEGIES[name] is max_weight:
+        return partial(max_weight, time_limit=time_limit)
+    return STRATEGIES[name]
@@ -0,0 +1,26 @@
+"""Пересчет накопленной статистики курьеров по заказам: python rebuild_stats.py [файл базы] [--check]
+
+С --check только сравнивает накопленное с посчитанным заново и завершается с кодом 1 при расхождениях.
+"""
+import sys
+
+from data import db_session
+from data.stats_queries import computed_stats, rebuild_stats, stats_differences, stored_stats
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != '--check']
+    db_session.global_init(args[0] if args else 'db/base.db')
+    sess = db_session.create_session()
+    if '--check' in sys.argv:
+        differences = stats_differences(stored_stats(sess), computed_stats(sess))
+    else:
+        differences = rebuild_stats(sess)
+    for name, keys in differences.items():
+        print(f'{name}: расхождений {len(keys)}' + (f', например {keys[:10]}' if keys else ''))
+    if '--check' in sys.argv and any(differences.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
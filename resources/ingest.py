@@ -0,0 +1,49 @@
+from flask import request, make_response, jsonify, abort, current_app
+from data.db_session import create_session
+from data.json_stream import JsonArrayReader
+
+
+def flag(name):
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def ingest_response(ingest_class, name):
+    """POST /couriers и /orders.
+
+    ?stream=1 - разбирать тело запроса потоково и загружать порциями по ?chunk_size= (по умолчанию
+    INGEST_CHUNK_SIZE), ?partial=1 - принимать корректные элементы, даже если в запросе есть ошибочные.
+    Если поток в режиме partial обрывается некорректным JSON, в ответе есть stream_error: сколько
+    элементов удалось прочитать и что не так с остальным телом; прочитанные элементы загружены.
+    """
+    sess = create_session()
+    partial = flag('partial')
+    chunk_size = None
+    items = None
+    if flag('stream'):
+        chunk_size = request.args.get('chunk_size', current_app.config['INGEST_CHUNK_SIZE'], type=int)
+        if chunk_size is None or chunk_size <= 0:
+            abort(400)
+        items = JsonArrayReader(request.stream).items('data')
+    else:
+        data = request.get_json()
+        if not isinstance(data, dict) or not isinstance(data.get('data'), list):
+            abort(400)
+        items = data['data']
+
+    ingest = ingest_class(sess)
+    try:
+        created, not_validate = ingest.run(items, chunk_size=chunk_size, partial=partial)
+    except ValueError:
+        sess.rollback()
+        abort(400)
+
+    errors = {}
+    if not_validate:
+        errors['validation_error'] = {name: [{'id': item_id} for item_id in not_validate]}
+    if ingest.stream_error is not None:
+        errors['stream_error'] = {'parsed': ingest.parsed, 'message': str(ingest.stream_error)}
+    if errors and not created:
+        return make_response(jsonify(errors), 400)
+    result = {name: [{'id': item_id} for item_id in created]}
+    result.update(errors)
+    return make_response(jsonify(result), 201)
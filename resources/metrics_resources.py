@@ -0,0 +1,14 @@
+from flask import make_response, jsonify
+from flask_restful import Resource
+from data.courier_cache import cache_stats
+from data.db_session import group_commit_stats, pool_stats
+from dispatch.pool import pool
+
+
+class MetricsResource(Resource):
+    def get(self):
+        """Попадания в кэши курьеров и группы коммитов с начала работы процесса,
+        размер пула заказов и занятые соединения с базой"""
+        return make_response(jsonify({'pool': {'orders': len(pool.orders)},
+                                      'courier_cache': cache_stats(), 'group_commit': group_commit_stats(),
+                                      'db_pool': pool_stats()}), 200)
@@ -1,53 +1,56 @@
 from datetime import datetime
 from flask import request, make_response, jsonify, abort
 from flask_restful import Resource
-from data.couriers import Courier
-from data.couriers_type import CourierType
-from data.db_session import create_session
-from data.intervals import Interval
-from data.intervals_delivery import IntervalDelivery
-from data.orders import Order
-from data.orders_regions import OrderRegion
-from data.regions import Regions
+from data.complete_queries import REJECTED, CompletionConflict, complete_orders, parse_timestamp
+from data.courier_cache import courier_profile, courier_profiles
+from data.db_session import create_session, write
+from data.dispatch_queries import claim_from_pool, lock_couriers, sync_pool, write_pool_change, active_deliveries
+from data.ingest import OrdersIngest
+from dispatch.pool import pool
+from resources.ingest import ingest_response
 
 
 class OrdersListResources(Resource):
     def post(self):
-        sess = create_session()
-        keys = ['order_id', 'weight', 'region', 'delivery_hours']
-        not_validate_orders = []
-        validate_object = []
-
-        for order_data in request.get_json()['data']:
-            if not all(key in keys for key in order_data) or len(keys) != len(order_data):
-                not_validate_orders.append(order_data['order_id'])
-                continue
-            if not isinstance(order_data['delivery_hours'], list):
-                not_validate_orders.append(order_data['order_id'])
-                continue
-
-            try:
-                order = Order(order_id=order_data['order_id'], weight=order_data['weight'])
-                region = OrderRegion(order_id=order_data['order_id'], region=order_data['region'])
-                intervals = [IntervalDelivery(order_id=order_data['order_id'],
-                                              time_start=time, time_stop=time)
-                             for time in order_data['delivery_hours']]
-
-                validate_object.extend([order] + [region] + intervals)
-            except (AssertionError, ValueError, IndexError, TypeError):
-                not_validate_orders.append(order_data['order_id'])
-
-        if not_validate_orders:
-            return make_response(
-                jsonify({'validation_error': {'orders': [{'id': courier_id} for courier_id in not_validate_orders]}}),
-                400)
-
-        for new_object in validate_object:
-            sess.add(new_object)
-        sess.commit()
-        return make_response(jsonify(
-            {'orders': [{'id': order.order_id}
-                        for order in filter(lambda x: isinstance(x, Order), validate_object)]}), 201)
+        return ingest_response(OrdersIngest, 'orders')
+
+
+def assign_result(order_ids, assign_time):
+    if not order_ids:
+        return {'orders': []}
+    return dict(orders=[{'id': order_id} for order_id in order_ids], assign_time=assign_time.isoformat() + 'Z')
+
+
+def assign_courier(sess, profile, assign_time):
+    """Работа для write_pool_change: ((развоз, который у курьера уже был, или None, новые заказы), изменение пула)"""
+    # до конца транзакции параллельное назначение этому же курьеру ждет
+    lock_couriers(sess, [profile.courier_id])
+    # развоз мог появиться после проверки вне транзакции
+    delivery = active_deliveries(sess, [profile.courier_id]).get(profile.courier_id)
+    if delivery:
+        return (delivery, []), None
+    chosen = claim_from_pool(sess, profile, assign_time)
+    return (None, chosen), (lambda pool: pool.remove_all(chosen)) if chosen else None
+
+
+def assign_couriers(sess, courier_ids, profiles, assign_time):
+    """Работа для write_pool_change: ({courier_id: (заказы, время назначения)}, изменение пула)"""
+    lock_couriers(sess, courier_ids)
+    deliveries = active_deliveries(sess, courier_ids)
+    results = {}
+    assigned = []
+    for courier_id in courier_ids:
+        if courier_id in deliveries:
+            orders = deliveries[courier_id]
+            results[courier_id] = ([order_id for order_id, assign_time in orders], orders[0][1])
+            continue
+        chosen = claim_from_pool(sess, profiles[courier_id], assign_time)
+        # выбранные заказы сразу убираем из пула, чтобы они не достались следующим курьерам
+        with pool.lock:
+            pool.remove_all(chosen)
+        assigned.extend(chosen)
+        results[courier_id] = (chosen, assign_time)
+    return results, (lambda pool: pool.remove_all(assigned)) if assigned else None
 
 
 class OrdersAssignResources(Resource):
@@ -55,82 +58,107 @@ class OrdersAssignResources(Resource):
         sess = create_session()
         keys = ['courier_id']
         data = request.get_json()
-        orders_for_courier = []
 
         if not all(key in keys for key in data) or len(keys) != len(data) or not isinstance(data['courier_id'], int):
             return make_response(jsonify(), 400)
 
         courier_id = data['courier_id']
-        courier = sess.query(Courier).filter(Courier.courier_id == courier_id).first()
-        if courier is None:
+        profile = courier_profile(sess, courier_id)
+        if profile is None:
             return make_response(jsonify(), 400)
 
-        intervals = sess.query(Interval).filter(Interval.courier_id == courier_id).all()
-        regions_courier = [region.region
-                           for region in sess.query(Regions).filter(Regions.courier_id == courier_id).all()]
-        orders = sess.query(Order).filter(Order.courier_id == None).all()
-        now = datetime.now()
-        delivery = sess.query(Order).filter(Order.courier_id == courier_id, Order.complete_time == None).all()
-        orders = sorted(orders, key=lambda order: order.weight)
-        print(delivery)
+        # у курьера уже есть развоз: ответ только читает базу и не встает в очередь за блокировкой записи
+        delivery = active_deliveries(sess, [courier_id]).get(courier_id)
+        if delivery is None:
+            now = datetime.now()
+            # перечитывание пула может быть долгим, поэтому до пишущей транзакции; если пул за это время
+            # устареет, чужие заказы просто не захватятся
+            sync_pool(sess)
+            delivery, orders_for_courier = write_pool_change(lambda sess: assign_courier(sess, profile, now))
         if delivery:
-            now = delivery[0].assign_time
-            orders_for_courier = [order.order_id for order in delivery]
-
-        else:
-            orders = sorted(orders, key=lambda order: order.weight)
-            sum_weight = 0
-            for order in orders:
-                order_regions = [order_region.region for order_region
-                                 in sess.query(OrderRegion).filter(OrderRegion.order_id == order.order_id).all()]
-
-                intervals_delivery = sess.query(IntervalDelivery).filter(IntervalDelivery.order_id == order.order_id)
-                suit_for_intervals = any([any(
-                    [interval_delivery.time_stop > interval.time_start and
-                     interval.time_stop > interval_delivery.time_start
-                     for interval_delivery in intervals_delivery]) for interval in intervals])
-                courier_carrying = sess.query(CourierType).filter(CourierType.type ==
-                                                                  courier.courier_type).first().carrying
-                suit_for_weight = (sum_weight + order.weight) <= courier_carrying
-                suit_for_region = set([]) != (set(order_regions) & set(regions_courier))
-                if suit_for_region and suit_for_weight and suit_for_intervals:
-                    order = sess.query(Order).filter(Order.order_id == order.order_id).first()
-                    order.courier_id = courier_id
-                    order.assign_time = now
-                    order.type_for_delivery = courier.courier_type
-                    sum_weight += order.weight
-                    # sess.add(order)
-                    orders_for_courier.append(order.order_id)
-                    sess.commit()
-
-        if not orders_for_courier:
-            return make_response(jsonify({'orders': []}), 200)
-        return make_response(jsonify(
-            dict(orders=[{'id': order_id} for order_id in orders_for_courier], assign_time=now.isoformat() + 'Z')), 200)
+            now = delivery[0][1]
+            orders_for_courier = [order_id for order_id, assign_time in delivery]
 
+        return make_response(jsonify(assign_result(orders_for_courier, now)), 200)
 
-class OrdersCompleteResources(Resource):
+
+class OrdersAssignBatchResources(Resource):
     def post(self):
+        """Назначение для нескольких курьеров одним проходом по пулу и одной транзакцией.
+
+        Курьеры обслуживаются в порядке запроса, заказ достается не больше чем одному из них.
+        """
         sess = create_session()
-        keys = ['courier_id', 'order_id', 'complete_time']
+        keys = ['courier_ids']
         data = request.get_json()
+
+        if not isinstance(data, dict) or not all(key in keys for key in data) or len(keys) != len(data):
+            return make_response(jsonify(), 400)
+        courier_ids = data['courier_ids']
+        if not isinstance(courier_ids, list) or not all(isinstance(courier_id, int) for courier_id in courier_ids) \
+                or len(set(courier_ids)) != len(courier_ids):
+            return make_response(jsonify(), 400)
+
+        profiles = courier_profiles(sess, courier_ids)
+        if len(profiles) != len(courier_ids):
+            return make_response(jsonify(), 400)
+
+        now = datetime.now()
+        sync_pool(sess)
         try:
-            if not all(key in keys for key in data) or len(keys) != len(data):
-                return abort(400)
-            if not isinstance(data['courier_id'], int) and not isinstance(data['order_id'], int):
-                abort(400)
-            order = sess.query(Order).filter(Order.order_id == data['order_id']).first()
-            if order is None or order.courier_id != data['courier_id']:
-                abort(400)
-
-            data['complete_time'] = datetime.strptime(data['complete_time'], '%Y-%m-%dT%H:%M:%S.%fZ')
-            if order.assign_time > data['complete_time'] and order.complete_time is None:
-                print('zdes')
-                abort(400)
-            if order.complete_time is None:
-                order.complete_time = data['complete_time']
-            sess.commit()
+            results = write_pool_change(lambda sess: assign_couriers(sess, courier_ids, profiles, now))
         except Exception:
+            # пул уже изменен, а транзакция не прошла - при следующем обращении он будет перечитан
+            pool.state = None
+            raise
+
+        return make_response(jsonify({'couriers': [dict(courier_id=courier_id, **assign_result(*results[courier_id]))
+                                                   for courier_id in courier_ids]}), 200)
+
+
+def completion_item(data):
+    """(courier_id, order_id, complete_time) или None, если элемент не прошел проверку"""
+    keys = ['courier_id', 'order_id', 'complete_time']
+    if not isinstance(data, dict) or sorted(data) != sorted(keys):
+        return None
+    if not isinstance(data['courier_id'], int) or not isinstance(data['order_id'], int) or \
+            not isinstance(data['complete_time'], str):
+        return None
+    try:
+        return data['courier_id'], data['order_id'], parse_timestamp(data['complete_time'])
+    except ValueError:
+        return None
+
+
+class OrdersCompleteResources(Resource):
+    def post(self):
+        item = completion_item(request.get_json())
+        if item is None:
+            abort(400)
+        try:
+            status, = write(lambda sess: complete_orders(sess, [item]))
+        except CompletionConflict:
+            abort(400)
+        if status == REJECTED:
             abort(400)
+        return make_response(jsonify({'order_id': item[1]}))
 
-        return make_response(jsonify({'order_id': order.order_id}))
+
+class OrdersCompleteBatchResources(Resource):
+    def post(self):
+        """Завершение нескольких заказов одной транзакцией, для каждого элемента возвращается свой статус.
+
+        Повтор уже выполненного завершения не ошибка, поэтому пачку можно безопасно отправить еще раз.
+        """
+        data = request.get_json()
+        if not isinstance(data, dict) or list(data) != ['data'] or not isinstance(data['data'], list):
+            return make_response(jsonify(), 400)
+
+        items = [completion_item(item) for item in data['data']]
+        try:
+            statuses = write(lambda sess: complete_orders(sess, items))
+        except CompletionConflict:
+            return make_response(jsonify(), 409)
+        return make_response(jsonify({'orders': [
+            {'order_id': item['order_id'] if isinstance(item, dict) else None, 'status': status}
+            for item, status in zip(data['data'], statuses)]}), 200)
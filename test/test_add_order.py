@@ -3,6 +3,7 @@ from app import app
 from data.couriers_type import CourierType
 from data.db_session import create_session, SqlAlchemyBase
 from data.db_session import global_init
+from data.ingest import OrdersIngest
 from data.intervals_delivery import IntervalDelivery
 from data.orders import Order
 from data.orders_regions import OrderRegion
@@ -308,3 +309,154 @@ def test_absence_order_delivery_hours(client):
     assert len(create_session().query(Order).all()) == 0
     assert len(create_session().query(OrderRegion).all()) == 0
     assert len(create_session().query(IntervalDelivery).all()) == 0
+
+
+def test_duplicate_order_id_in_payload(client):
+    json = {"data": [{
+        "order_id": 1,
+        "weight": 0.23,
+        "region": 12,
+        "delivery_hours": ["09:00-18:00"]
+    },
+        {
+            "order_id": 2,
+            "weight": 1,
+            "region": 12,
+            "delivery_hours": ["09:00-18:00"]
+        },
+        {
+            "order_id": 2,
+            "weight": 3,
+            "region": 13,
+            "delivery_hours": ["10:00-11:00"]
+        }]}
+    rv = client.post('/orders', json=json)
+    assert rv.status_code == 400
+    assert rv.data == b'{"validation_error":{"orders":[{"id":2}]}}\n'
+    assert len(create_session().query(Order).all()) == 0
+    assert len(create_session().query(OrderRegion).all()) == 0
+    assert len(create_session().query(IntervalDelivery).all()) == 0
+
+
+def test_stream_add_orders(client):
+    json = {"data": [{
+        "order_id": i,
+        "weight": 1,
+        "region": 12,
+        "delivery_hours": ["09:00-18:00"]
+    } for i in range(1, 6)]}
+    rv = client.post('/orders?stream=1&chunk_size=2', json=json)
+    assert rv.status_code == 201
+    assert rv.data == b'{"orders":[{"id":1},{"id":2},{"id":3},{"id":4},{"id":5}]}\n'
+    assert len(create_session().query(Order).all()) == 5
+    assert len(create_session().query(OrderRegion).all()) == 5
+    assert len(create_session().query(IntervalDelivery).all()) == 5
+
+
+def test_stream_add_orders_atomic(client):
+    json = {"data": [{
+        "order_id": i,
+        "weight": 1,
+        "region": 12,
+        "delivery_hours": ["09:00-18:00"]
+    } for i in range(1, 6)] + [{"order_id": 2, "weight": 1, "region": 12, "delivery_hours": ["9:00"]}]}
+    rv = client.post('/orders?stream=1&chunk_size=2', json=json)
+    assert rv.status_code == 400
+    assert rv.data == b'{"validation_error":{"orders":[{"id":2}]}}\n'
+    assert len(create_session().query(Order).all()) == 0
+    assert len(create_session().query(OrderRegion).all()) == 0
+    assert len(create_session().query(IntervalDelivery).all()) == 0
+
+
+def test_stream_add_orders_partial(client):
+    json = {"data": [{
+        "order_id": 1,
+        "weight": 1,
+        "region": 12,
+        "delivery_hours": ["09:00-18:00"]
+    },
+        {
+            "order_id": 2,
+            "weight": 100,
+            "region": 12,
+            "delivery_hours": ["09:00-18:00"]
+        },
+        {
+            "order_id": 3,
+            "weight": 2,
+            "region": 12,
+            "delivery_hours": ["09:00-18:00"]
+        }]}
+    rv = client.post('/orders?stream=1&chunk_size=2&partial=1', json=json)
+    assert rv.status_code == 201
+    assert rv.data == b'{"orders":[{"id":1},{"id":3}],"validation_error":{"orders":[{"id":2}]}}\n'
+    assert sorted(order.order_id for order in create_session().query(Order).all()) == [1, 3]
+    assert len(create_session().query(OrderRegion).all()) == 2
+    assert len(create_session().query(IntervalDelivery).all()) == 2
+
+
+def test_partial_insert_conflict(client, monkeypatch):
+    client.post('/orders', json={"data": [{"order_id": 2, "weight": 1, "region": 12,
+                                          "delivery_hours": ["09:00-18:00"]}]})
+    # как будто заказ 2 вставил параллельный запрос уже после проверки id
+    monkeypatch.setattr('data.ingest.find_existing', lambda sess, column, values: set())
+    json = {"data": [{
+        "order_id": i,
+        "weight": 1,
+        "region": 12,
+        "delivery_hours": ["09:00-18:00"]
+    } for i in range(1, 4)]}
+    rv = client.post('/orders?partial=1', json=json)
+    assert rv.status_code == 201
+    assert rv.data == b'{"orders":[{"id":1},{"id":3}],"validation_error":{"orders":[{"id":2}]}}\n'
+    assert sorted(order.order_id for order in create_session().query(Order).all()) == [1, 2, 3]
+    assert len(create_session().query(OrderRegion).all()) == 3
+
+
+def test_partial_chunk_visible_after_commit(client, monkeypatch):
+    # savepoint порции вложен в ее транзакцию: пока порция не закоммичена, другие соединения ее не видят
+    visible = []
+    commit = OrdersIngest.commit
+
+    def check_and_commit(self):
+        with self.sess.get_bind().connect() as connection:
+            visible.append(sorted(order_id for order_id, in connection.execute('SELECT order_id FROM orders')))
+        commit(self)
+
+    monkeypatch.setattr(OrdersIngest, 'commit', check_and_commit)
+    json = {"data": [{
+        "order_id": i,
+        "weight": 1,
+        "region": 12,
+        "delivery_hours": ["09:00-18:00"]
+    } for i in range(1, 4)]}
+    rv = client.post('/orders?stream=1&chunk_size=2&partial=1', json=json)
+    assert rv.status_code == 201
+    assert visible == [[], [1, 2], [1, 2, 3]]
+
+
+def test_stream_broken_json(client):
+    rv = client.post('/orders?stream=1', data='{"data": [{"order_id": 1, "weight": 1, ',
+                     content_type='application/json')
+    assert rv.status_code == 400
+    assert len(create_session().query(Order).all()) == 0
+
+
+def test_stream_broken_json_partial(client):
+    body = ('{"data": [{"order_id": 1, "weight": 1, "region": 12, "delivery_hours": ["09:00-18:00"]}, '
+            '{"order_id": 2, "weight": 1, "region": 12, "delivery_hours": ["09:00-18:00"]}, {"order_id": 3, ')
+    rv = client.post('/orders?stream=1&chunk_size=1&partial=1', data=body, content_type='application/json')
+    assert rv.status_code == 201
+    result = rv.get_json()
+    assert result['orders'] == [{'id': 1}, {'id': 2}] and result['stream_error']['parsed'] == 2
+    assert sorted(order.order_id for order in create_session().query(Order).all()) == [1, 2]
+
+    rv = client.post('/orders?stream=1&partial=1', data='{"data": [', content_type='application/json')
+    assert rv.status_code == 400 and rv.get_json()['stream_error']['parsed'] == 0
+
+
+def test_stream_trailing_data(client):
+    body = '{"data": [{"order_id": 1, "weight": 1, "region": 12, "delivery_hours": ["09:00-18:00"]}]} {"data": []}'
+    rv = client.post('/orders?stream=1', data=body, content_type='application/json')
+    assert rv.status_code == 400
+    assert len(create_session().query(Order).all()) == 0
@@ -0,0 +1,153 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from os import mkdir
+from os.path import exists
+from random import Random
+import pytest
+from app import app
+from data.couriers_type import CourierType, courier_types
+from data.db_session import begin_write, create_session, SqlAlchemyBase
+from data.db_session import global_init
+from data.couriers import Courier
+from data.dispatch_queries import bump_pool_state, claim_orders, courier_regions, sync_pool
+from data.orders import Order
+from data.time_interval import unpack_mask
+from dispatch.engine import select_orders
+from dispatch.pool import pool
+
+COURIERS = 100
+ORDERS = 1500
+ASSIGNS = 2000
+# курьеры, заказы которым назначает другой процесс
+FOREIGN_COURIER = 10000
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+def add_couriers():
+    rnd = Random(1)
+    json = {"data": [{"courier_id": courier_id,
+                      "courier_type": rnd.choice(['foot', 'bike', 'car']),
+                      "regions": rnd.sample(range(1, 6), rnd.randint(1, 3)),
+                      "working_hours": ["08:00-20:00"]} for courier_id in range(1, COURIERS + 1)]}
+    app.test_client().post('/couriers', json=json)
+    # курьеры "другого процесса" тоже есть в базе, иначе с foreign_keys=ON их заказы не сохранятся
+    json = {"data": [{"courier_id": FOREIGN_COURIER + seed, "courier_type": "car", "regions": [1],
+                      "working_hours": ["08:00-20:00"]} for seed in range(0, ASSIGNS, 50)]}
+    app.test_client().post('/couriers', json=json)
+
+
+def add_orders():
+    rnd = Random(2)
+    json = {"data": [{"order_id": order_id,
+                      "weight": rnd.randint(1, 1000) / 100,
+                      "region": rnd.randint(1, 5),
+                      "delivery_hours": ["10:00-12:00"]} for order_id in range(1, ORDERS + 1)]}
+    app.test_client().post('/orders', json=json)
+
+
+# функция которая будет выполняться перед началом тестов
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_couriers()
+    add_orders()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def assign(courier_id):
+    rv = app.test_client().post('/orders/assign', json={'courier_id': courier_id})
+    assert rv.status_code == 200
+    return courier_id, [order['id'] for order in rv.get_json()['orders']]
+
+
+def assign_batch(courier_ids):
+    rv = app.test_client().post('/orders/assign/batch', json={'courier_ids': courier_ids})
+    assert rv.status_code == 200
+    return [(result['courier_id'], [order['id'] for order in result['orders']])
+            for result in rv.get_json()['couriers']]
+
+
+def foreign_claim(seed):
+    """Другой процесс со своим пулом: забирает случайные свободные заказы мимо пула этого процесса"""
+    rnd = Random(seed)
+    sess = create_session()
+    begin_write(sess)
+    free = [order_id for order_id, in sess.query(Order.order_id).filter(Order.courier_id == None)]
+    courier_id = FOREIGN_COURIER + seed
+    won = claim_orders(sess, rnd.sample(free, min(len(free), 3)), courier_id, datetime.now(), 'car')
+    bump_pool_state(sess)
+    sess.commit()
+    return [(courier_id, sorted(won))]
+
+
+def test_concurrent_assigns_never_double_book(client):
+    rnd = Random(3)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        futures = []
+        for i in range(ASSIGNS):
+            if i % 50 == 0:
+                futures.append(executor.submit(foreign_claim, i))
+            elif i % 20 == 0:
+                futures.append(executor.submit(assign_batch, rnd.sample(range(1, COURIERS + 1), 5)))
+            else:
+                futures.append(executor.submit(lambda courier_id: [assign(courier_id)], rnd.randint(1, COURIERS)))
+        results = [result for future in futures for result in future.result()]
+
+    owners = {}
+    deliveries = {}
+    for courier_id, order_ids in results:
+        for order_id in order_ids:
+            owners.setdefault(order_id, set()).add(courier_id)
+        # заказы не завершаются, поэтому курьер каждый раз получает один и тот же набор
+        if order_ids:
+            assert deliveries.setdefault(courier_id, set(order_ids)) == set(order_ids)
+    assert all(len(couriers) == 1 for couriers in owners.values())
+
+    sess = create_session()
+    assigned = {order_id: courier_id for order_id, courier_id in sess.query(Order.order_id, Order.courier_id).filter(
+        Order.courier_id != None)}
+    assert {order_id: couriers.pop() for order_id, couriers in owners.items()} == assigned
+    # заказы, захваченные "другим процессом" после последней синхронизации, пул еще может помнить
+    assert set(pool.orders).isdisjoint(
+        order_id for order_id, courier_id in assigned.items() if courier_id < FOREIGN_COURIER)
+    sync_pool(sess)
+    assert set(pool.orders).isdisjoint(assigned)
+
+
+def test_lost_claim_takes_next_candidate(client):
+    sess = create_session()
+    sync_pool(sess)
+    courier = sess.query(Courier).filter(Courier.courier_id == 1).first()
+    regions = courier_regions(sess, 1)
+    taken = next(pool.candidates(regions)).order_id
+    expected = select_orders([candidate for candidate in pool.candidates(regions) if candidate.order_id != taken],
+                             regions, unpack_mask(courier.hours_mask), courier_types[courier.courier_type].carrying)
+    # самый легкий заказ курьера забрали в обход пула, и пул об этом еще не знает
+    sess = create_session()
+    claim_orders(sess, [taken], FOREIGN_COURIER, datetime.now(), 'car')
+    sess.commit()
+    assert taken in pool.orders
+    rv = client.post('/orders/assign', json={'courier_id': 1})
+    order_ids = [order['id'] for order in rv.get_json()['orders']]
+    assert order_ids == expected and taken not in order_ids
+    owners = create_session().query(Order.courier_id).filter(Order.order_id.in_(order_ids)).distinct().all()
+    assert owners == [(1,)]
+    assert taken not in pool.orders
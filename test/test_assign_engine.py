@@ -0,0 +1,75 @@
+from random import Random
+from dispatch.engine import Candidate, by_weight, overflow, select_orders
+from data.time_interval import TimeInterval, hours_mask, parse_interval
+
+
+def candidate(order_id, weight, regions, hours):
+    return Candidate(order_id, weight, frozenset(regions), hours_mask(parse_interval(value) for value in hours))
+
+
+def legacy_select(candidates, regions, intervals, carrying):
+    # candidates - пары (заказ, интервалы доставки), как раньше сравнивались интервалы из базы
+    chosen = []
+    sum_weight = 0
+    for order, delivery in sorted(candidates, key=lambda item: item[0].weight):
+        suit_for_intervals = any([any([d.time_stop > i.time_start and i.time_stop > d.time_start
+                                       for d in delivery]) for i in intervals])
+        suit_for_weight = (sum_weight + order.weight) <= carrying
+        suit_for_region = set([]) != (set(order.regions) & set(regions))
+        if suit_for_region and suit_for_weight and suit_for_intervals:
+            sum_weight += order.weight
+            chosen.append(order.order_id)
+    return chosen
+
+
+def test_select_orders():
+    candidates = by_weight([
+        candidate(1, 0.23, [11], ['08:00-09:00']),
+        candidate(2, 7, [11], ['08:00-09:00']),
+        candidate(3, 8, [11], ['08:00-09:00']),
+        candidate(4, 0.5, [12], ['08:00-09:00']),
+        candidate(5, 0.1, [11], ['11:00-11:35']),
+        candidate(6, 0.2, [11], ['11:00-11:36']),
+    ])
+    mask = hours_mask([parse_interval('11:35-14:05'), parse_interval('08:00-11:00')])
+    assert select_orders(candidates, {11}, mask, 15) == [6, 1, 2]
+    assert select_orders(candidates, {11}, mask, 15, sum_weight=14.5) == [6, 1]
+    assert select_orders(candidates, {13}, mask, 50) == []
+    assert select_orders(candidates, {11}, 0, 50) == []
+    assert select_orders([], {11}, mask, 50) == []
+
+
+def test_select_orders_matches_legacy_loop():
+    rnd = Random(6)
+    for _ in range(200):
+        candidates = []
+        for order_id in range(1, rnd.randint(1, 60)):
+            hours = []
+            for _ in range(rnd.randint(0, 3)):
+                start = rnd.randrange(0, 1439)
+                hours.append(TimeInterval(start, rnd.randint(start + 1, 1439)))
+            candidates.append((Candidate(order_id, rnd.randint(1, 5000) / 100,
+                                         frozenset(rnd.sample(range(1, 8), rnd.randint(1, 2))), hours_mask(hours)),
+                               hours))
+        regions = set(rnd.sample(range(1, 8), rnd.randint(1, 4)))
+        intervals = [TimeInterval(start, start + rnd.randint(1, 300)) for start in rnd.sample(range(0, 1100), 2)]
+        carrying = rnd.choice([10, 15, 50])
+        selected = select_orders(by_weight(order for order, delivery in candidates), regions, hours_mask(intervals),
+                                 carrying)
+        assert selected == legacy_select(candidates, regions, intervals, carrying)
+
+
+def test_overflow():
+    candidates = [
+        candidate(1, 3, [11], ['09:00-10:00']),
+        candidate(2, 4, [12], ['11:00-12:00']),
+        candidate(3, 5, [11], ['13:00-14:00']),
+        candidate(4, 5, [12], ['15:00-16:00']),
+        candidate(5, 2, [12], ['09:00-10:00']),
+    ]
+    mask = hours_mask([parse_interval('09:00-15:00')])
+    # 4 не подходит по часам, из остальных сначала снимается самый тяжелый
+    assert overflow(candidates, {11, 12}, mask, 10) == [4, 3]
+    assert overflow(candidates, {12}, mask, 10) == [1, 3, 4]
+    assert overflow(candidates, {11, 12}, mask, 1) == [4, 3, 2, 1, 5]
+    assert overflow(candidates, {11, 12}, hours_mask([parse_interval('00:00-23:59')]), 19) == []
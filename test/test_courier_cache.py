@@ -0,0 +1,93 @@
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data.courier_cache import LRUCache, courier_profile, profiles
+from data.couriers import Courier
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+from data.regions import Regions
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+def add_courier():
+    json = {"data": [{"courier_id": 1, "courier_type": "bike", "regions": [3, 1],
+                      "working_hours": ["09:00-11:00", "12:00-13:30"]}]}
+    app.test_client().post('/couriers', json=json)
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_courier()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def cache_metrics(client):
+    return client.get('/metrics').get_json()['courier_cache']['profiles']
+
+
+def test_profile_snapshot(client):
+    profile = courier_profile(create_session(), 1)
+    assert (profile.courier_type, profile.carrying, profile.regions, profile.region_list) == \
+        ('bike', 15, frozenset({1, 3}), (3, 1))
+    assert profile.working_hours == ('09:00-11:00', '12:00-13:30')
+    assert courier_profile(create_session(), 1) is profile
+    assert courier_profile(create_session(), 2) is None
+
+
+def test_profile_reused_and_invalidated(client):
+    before = cache_metrics(client)
+    client.post('/orders/assign', json={'courier_id': 1})
+    client.post('/orders/assign', json={'courier_id': 1})
+    client.get('/couriers/1')
+    after = cache_metrics(client)
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 2
+
+    rv = client.patch('/couriers/1', json={'regions': [7], 'courier_type': 'car'})
+    assert rv.get_json()['regions'] == [7]
+    profile = courier_profile(create_session(), 1)
+    assert (profile.regions, profile.carrying) == (frozenset({7}), 50)
+
+
+def test_change_from_other_process(client):
+    profile = courier_profile(create_session(), 1)
+    # другой процесс поменял районы и версию курьера, кэш этого процесса о них не знает
+    sess = create_session()
+    sess.query(Regions).filter(Regions.courier_id == 1).delete()
+    sess.add(Regions(courier_id=1, region=9))
+    sess.query(Courier).filter(Courier.courier_id == 1).update({Courier.version: Courier.version + 1})
+    sess.commit()
+    assert profiles.get(1) is profile
+    assert courier_profile(create_session(), 1).regions == frozenset({9})
+    assert client.get('/couriers/1').get_json()['regions'] == [9]
+
+
+def test_lru_eviction():
+    cache = LRUCache(2)
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+    assert cache.get(1) == 'a'
+    cache.put(3, 'c')
+    assert cache.get(2) is None and cache.get(1) == 'a' and cache.get(3) == 'c'
+    assert cache.stats() == {'size': 2, 'max_size': 2, 'hits': 3, 'misses': 1}
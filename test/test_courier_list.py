@@ -247,3 +247,31 @@ def test_absence_courier_working_hours(client):
     assert rv.data == b'{"validation_error":{"couriers":[{"id":1},{"id":2}]}}\n'
     for courier_data in json_wrong['data']:
         assert sess.query(Courier).filter(Courier.courier_id == courier_data['courier_id']).first() is None
+
+
+def test_duplicate_courier_id_in_payload(client):
+    sess = create_session()
+    json_wrong = {'data': [{
+        "courier_id": 1,
+        "courier_type": "foot",
+        "regions": [1],
+        "working_hours": ["11:35-14:05"]
+    },
+        {
+            "courier_id": 2,
+            "courier_type": "bike",
+            "regions": [3],
+            "working_hours": ["07:00-08:00"]
+        },
+        {
+            "courier_id": 1,
+            "courier_type": "car",
+            "regions": [2],
+            "working_hours": ["07:00-08:00"]
+        }]}
+    rv = client.post('/couriers', json=json_wrong)
+    assert rv.status_code == 400
+    assert rv.data == b'{"validation_error":{"couriers":[{"id":1}]}}\n'
+    assert sess.query(Courier).all() == []
+    assert sess.query(Regions).all() == []
+    assert sess.query(Interval).all() == []
@@ -3,6 +3,7 @@ from json import loads
 from os import mkdir
 from os.path import exists
 import pytest
+from sqlalchemy import event
 from app import app
 from data.couriers import Courier
 from data.couriers_type import CourierType
@@ -377,3 +378,38 @@ def test_wrong_courier_type(client):
     rv = client.patch('/couriers/1',
                       json=json)
     assert rv.status_code == 400
+
+
+def patch_statements(client, courier_id, order_ids):
+    """Назначает новому курьеру заказы order_ids и считает SQL-запросы PATCH, который их все снимает"""
+    client.post('/couriers', json={"data": [{"courier_id": courier_id, "courier_type": "car",
+                                             "regions": [courier_id * 10], "working_hours": ["10:00-11:00"]}]})
+    client.post('/orders', json={"data": [{"order_id": order_id, "weight": 0.5, "region": courier_id * 10,
+                                           "delivery_hours": ["10:00-11:00"]} for order_id in order_ids]})
+    assert len(client.post('/orders/assign', json={'courier_id': courier_id}).get_json()['orders']) == len(order_ids)
+    statements = []
+    engine = create_session().get_bind()
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        rv = client.patch(f'/couriers/{courier_id}', json={"regions": [courier_id * 10 + 1]})
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert rv.status_code == 200
+    assert create_session().query(Order).filter(Order.courier_id == courier_id).count() == 0
+    return len(statements)
+
+
+def test_patch_statements_do_not_grow_with_orders(client):
+    assert patch_statements(client, 2, range(10, 13)) == patch_statements(client, 3, range(20, 70))
+
+
+def test_knapsack_trimming_keeps_max_weight(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'TRIM_STRATEGY', 'knapsack')
+    client.post('/orders/assign', json={'courier_id': 1})
+    rv = client.patch('/couriers/1', json={"courier_type": "foot"})
+    assert rv.status_code == 200
+    sess = create_session()
+    kept = [order.order_id for order in sess.query(Order).filter(Order.courier_id == 1).order_by(Order.order_id)]
+    # из 3, 4, 5 и 6 кг остаются 4 и 6 - ровно 10 кг, heaviest оставила бы 3 и 4
+    assert kept == [2, 4]
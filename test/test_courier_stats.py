@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data.courier_stats import CourierRegionStats, CourierStats
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+from data.deliveries import Delivery
+from data.migrations import backfill_courier_stats
+from data.orders import Order
+from data.stats_queries import computed_stats, rebuild_stats, stats_differences, stored_stats
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+def add_couriers():
+    json = {"data": [
+        {"courier_id": 1, "courier_type": "car", "regions": [1, 2, 3], "working_hours": ["00:00-23:59"]},
+        {"courier_id": 2, "courier_type": "bike", "regions": [1], "working_hours": ["00:00-23:59"]}]}
+    app.test_client().post('/couriers', json=json)
+
+
+def add_orders(order_ids, region):
+    json = {"data": [{"order_id": order_id, "weight": 1, "region": region, "delivery_hours": ["00:00-23:59"]}
+                     for order_id in order_ids]}
+    app.test_client().post('/orders', json=json)
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_couriers()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def complete(client, courier_id, order_id, minutes):
+    complete_time = (datetime.now() + timedelta(minutes=minutes)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    rv = client.post('/orders/complete', json={'courier_id': courier_id, 'order_id': order_id,
+                                               'complete_time': complete_time})
+    assert rv.status_code == 200
+
+
+def consistent():
+    sess = create_session()
+    differences = stats_differences(stored_stats(sess), computed_stats(sess))
+    return differences == {'deliveries': [], 'couriers': [], 'regions': []}
+
+
+def test_stats_follow_completions(client):
+    add_orders(range(1, 4), 1)
+    add_orders(range(4, 6), 2)
+    client.post('/orders/assign', json={'courier_id': 1})
+    # завершения приходят не по порядку времени
+    for order_id, minutes in ((3, 30), (1, 10), (4, 25), (2, 10)):
+        complete(client, 1, order_id, minutes)
+        assert consistent()
+    assert client.get('/couriers/1').get_json()['earnings'] == 0
+
+    complete(client, 1, 5, 40)
+    # повторное завершение ничего не меняет
+    complete(client, 1, 5, 50)
+    data = client.get('/couriers/1').get_json()
+    assert data['earnings'] == 500 * 9
+    # быстрее всего район 1: в среднем (10 + 0 + 20) / 3 минут на заказ
+    assert data['rating'] == pytest.approx((60 - 10) / 60 * 5, abs=0.01)
+    assert consistent()
+
+    add_orders(range(6, 8), 3)
+    client.post('/orders/assign', json={'courier_id': 1})
+    complete(client, 1, 6, 60)
+    complete(client, 1, 7, 70)
+    assert client.get('/couriers/1').get_json()['earnings'] == 2 * 500 * 9
+    assert consistent()
+
+
+def test_release_finishes_delivery(client):
+    add_orders(range(1, 3), 1)
+    add_orders([3], 2)
+    client.post('/orders/assign', json={'courier_id': 1})
+    complete(client, 1, 1, 10)
+    complete(client, 1, 2, 20)
+    assert 'rating' not in client.get('/couriers/1').get_json()
+    # заказ из района 2 снимается с курьера, и развоз оказывается завершен
+    client.patch('/couriers/1', json={'regions': [1]})
+    data = client.get('/couriers/1').get_json()
+    assert data['earnings'] == 500 * 9 and 'rating' in data
+    assert consistent()
+
+
+def test_rebuild_fixes_stats(client):
+    add_orders(range(1, 3), 1)
+    client.post('/orders/assign', json={'courier_id': 2})
+    complete(client, 2, 1, 10)
+    complete(client, 2, 2, 20)
+    expected = client.get('/couriers/2').get_json()
+
+    sess = create_session()
+    sess.query(CourierStats).filter(CourierStats.courier_id == 2).update({CourierStats.earnings: 1})
+    sess.commit()
+    assert not consistent()
+    etag = client.get('/couriers/2').get_etag()[0]
+    assert rebuild_stats(create_session()) == {'deliveries': [], 'couriers': [2], 'regions': []}
+    assert consistent()
+    rv = client.get('/couriers/2', headers={'If-None-Match': f'"{etag}"'})
+    assert rv.status_code == 200 and rv.get_json() == expected
+
+    sess = create_session()
+    sess.query(CourierStats).delete()
+    sess.query(CourierRegionStats).delete()
+    sess.commit()
+    backfill_courier_stats(sess.bind)
+    assert client.get('/couriers/2').get_json() == expected
+
+
+def test_delivery_counters(client):
+    add_orders(range(1, 4), 1)
+    add_orders([4], 2)
+    client.post('/orders/assign', json={'courier_id': 1})
+    client.post('/orders/assign/batch', json={'courier_ids': [2]})
+    sess = create_session()
+    delivery = sess.query(Delivery).filter(Delivery.courier_id == 1).one()
+    assert (delivery.courier_type, delivery.orders_count, delivery.completed_count) == ('car', 4, 0)
+    assert sess.query(Delivery).filter(Delivery.courier_id == 2).count() == 0
+
+    complete(client, 1, 1, 10)
+    client.patch('/couriers/1', json={'regions': [1]})
+    sess = create_session()
+    delivery = sess.query(Delivery).filter(Delivery.courier_id == 1).one()
+    assert (delivery.orders_count, delivery.completed_count) == (3, 1)
+    delivery_id = delivery.id
+    assert sess.query(Order.delivery_id).filter(Order.order_id == 4).scalar() is None
+
+    # курьер стал пешим и не унесет ни одного оставшегося заказа - развоз завершен одним заказом
+    client.patch('/couriers/1', json={'courier_type': 'foot', 'regions': [2]})
+    sess = create_session()
+    assert sess.query(Delivery.orders_count).filter(Delivery.courier_id == 1).scalar() == 1
+    assert client.get('/couriers/1').get_json()['earnings'] == 500 * 9
+    assert consistent()
+
+    sess.query(Delivery).update({Delivery.completed_count: 0})
+    sess.commit()
+    assert rebuild_stats(create_session())['deliveries'] == [delivery_id]
+    assert consistent()
@@ -0,0 +1,84 @@
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data.couriers_type import CourierType, CourierTypeInfo, CourierTypeRegistry, courier_types
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def test_lookup(client):
+    registry = CourierTypeRegistry()
+    assert registry['car'] == CourierTypeInfo(50, 9)
+    assert registry['foot'].carrying == 10 and registry['bike'].coefficient == 5
+    assert 'plane' not in registry and registry.get('plane') is None
+    with pytest.raises(KeyError):
+        registry['plane']
+
+
+def test_loaded_once(client, monkeypatch):
+    registry = CourierTypeRegistry()
+    registry.reload()
+    reloads = []
+    load = registry.load
+    monkeypatch.setattr(registry, 'load', lambda sess=None: reloads.append(1) or load(sess))
+    for _ in range(10):
+        assert registry['bike'].carrying == 15 and 'car' in registry
+    assert reloads == []
+    # неизвестный тип - повод перечитать таблицу, вдруг его добавили после загрузки
+    sess = create_session()
+    sess.add(CourierType(type='plane', carrying=100, coefficient=20))
+    sess.commit()
+    assert registry['plane'] == CourierTypeInfo(100, 20)
+    assert reloads == [1]
+
+
+def test_misses_remembered(client, monkeypatch):
+    registry = CourierTypeRegistry()
+    registry.reload()
+    reloads = []
+    load = registry.load
+    monkeypatch.setattr(registry, 'load', lambda sess=None: reloads.append(1) or load(sess))
+    for _ in range(10):
+        assert 'plane' not in registry and 'boat' not in registry
+    assert reloads == [1, 1]
+    sess = create_session()
+    sess.add(CourierType(type='plane', carrying=100, coefficient=20))
+    sess.commit()
+    # промах помнится до явного reload, как после добавления типа в app.add_courier_types
+    assert 'plane' not in registry
+    registry.reload()
+    assert registry['plane'] == CourierTypeInfo(100, 20)
+
+
+def test_unknown_type_rejected(client):
+    json = {"data": [{"courier_id": 1, "courier_type": "plane", "regions": [1], "working_hours": []},
+                     {"courier_id": 2, "courier_type": "car", "regions": [1], "working_hours": []}]}
+    rv = client.post('/couriers', json=json)
+    assert rv.status_code == 400
+    assert 'car' in courier_types and 'plane' not in courier_types
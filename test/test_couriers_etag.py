@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data.courier_cache import bodies
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+from resources.courier_resources import CouriersResource
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+def add_courier():
+    json = {"data": [{"courier_id": 1, "courier_type": "car", "regions": [1], "working_hours": ["00:00-23:59"]},
+                     {"courier_id": 2, "courier_type": "foot", "regions": [2], "working_hours": ["00:00-23:59"]}]}
+    app.test_client().post('/couriers', json=json)
+
+
+def add_orders():
+    json = {"data": [{"order_id": order_id, "weight": 1, "region": 1, "delivery_hours": ["00:00-23:59"]}
+                     for order_id in (1, 2)]}
+    app.test_client().post('/orders', json=json)
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_courier()
+    add_orders()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def get(client, etag=None):
+    return client.get('/couriers/1', headers={'If-None-Match': f'"{etag}"'} if etag else {})
+
+
+def assert_changed(client, etag):
+    rv = get(client, etag)
+    assert rv.status_code == 200 and rv.get_etag()[0] != etag
+    return rv.get_etag()[0]
+
+
+def test_not_modified_until_write(client):
+    rv = get(client)
+    etag, _ = rv.get_etag()
+    assert rv.status_code == 200 and etag
+    rv = get(client, etag)
+    assert rv.status_code == 304 and rv.data == b''
+
+    client.patch('/couriers/1', json={'regions': [1, 3]})
+    etag = assert_changed(client, etag)
+    assert client.post('/orders/assign', json={'courier_id': 1}).get_json()['orders']
+    etag = assert_changed(client, etag)
+    complete_time = (datetime.now() + timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    client.post('/orders/complete', json={'courier_id': 1, 'order_id': 1, 'complete_time': complete_time})
+    etag = assert_changed(client, etag)
+    # другой курьер и назначение без заказов версию не меняют
+    client.patch('/couriers/2', json={'regions': [3]})
+    client.post('/orders/assign', json={'courier_id': 2})
+    assert get(client, etag).status_code == 304
+
+
+def test_cached_body(client, monkeypatch):
+    expected = get(client).get_json()
+    calls = []
+    profile = CouriersResource.profile
+    monkeypatch.setattr(CouriersResource, 'profile', staticmethod(
+        lambda sess, courier_id, version: calls.append(courier_id) or profile(sess, courier_id, version)))
+    assert get(client).get_json() == expected
+    assert calls == []
+    client.patch('/couriers/1', json={'courier_type': 'bike'})
+    assert get(client).get_json() == dict(expected, courier_type='bike')
+    assert calls == [1]
+
+
+def test_new_courier_drops_cached_body(client):
+    get(client)
+    version, body = bodies.get(1)
+    # тело, оставшееся от курьера с тем же id и той же версией в пересозданной базе
+    bodies.put(3, (version, dict(body, courier_id=3)))
+    client.post('/couriers', json={"data": [{"courier_id": 3, "courier_type": "bike", "regions": [5],
+                                             "working_hours": []}]})
+    assert bodies.get(3) is None
+    assert client.get('/couriers/3').get_json()['regions'] == [5]
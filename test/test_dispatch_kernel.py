@@ -0,0 +1,84 @@
+from random import Random
+import pytest
+from data.time_interval import TimeInterval, hours_mask
+from dispatch import kernel, pool as pool_module
+from dispatch.engine import Candidate, by_weight, select_orders
+from dispatch.pool import OrderPool
+
+needs_numpy = pytest.mark.skipif(not kernel.available, reason='нужен numpy')
+
+
+def random_mask(rnd):
+    hours = []
+    for _ in range(rnd.randint(0, 4)):
+        start = rnd.randrange(0, 1439)
+        hours.append(TimeInterval(start, rnd.randint(start + 1, 1440)))
+    return hours_mask(hours)
+
+
+def random_candidates(rnd, ids):
+    return [Candidate(order_id, rnd.randint(1, 5000) / 100, frozenset(rnd.sample(range(1, 8), rnd.randint(1, 2))),
+                      random_mask(rnd)) for order_id in ids]
+
+
+def test_mask_runs():
+    assert kernel.mask_runs(0) == []
+    hours = [TimeInterval(0, 1), TimeInterval(5, 10), TimeInterval(10, 20), TimeInterval(600, 1440)]
+    assert kernel.mask_runs(hours_mask(hours)) == [(0, 1), (5, 20), (600, 1440)]
+    rnd = Random(1)
+    for _ in range(200):
+        mask = random_mask(rnd)
+        assert hours_mask(TimeInterval(*run) for run in kernel.mask_runs(mask)) == mask
+
+
+@needs_numpy
+def test_columns_match_select_orders():
+    rnd = Random(9)
+    for _ in range(50):
+        candidates = {candidate.order_id: candidate for candidate in random_candidates(rnd, range(1, 300))}
+        columns = kernel.OrderColumns()
+        for candidate in candidates.values():
+            columns.add(candidate)
+        for _ in range(5):
+            # удаления и повторные добавления между подборами, как при назначении и PATCH курьера
+            for order_id in rnd.sample(sorted(candidates), 60):
+                columns.remove(candidates.pop(order_id))
+            for candidate in random_candidates(rnd, rnd.sample(range(300, 400), 10)):
+                if candidate.order_id in candidates:
+                    columns.remove(candidates[candidate.order_id])
+                candidates[candidate.order_id] = candidate
+                columns.add(candidate)
+            regions = set(rnd.sample(range(1, 8), rnd.randint(1, 4)))
+            mask = random_mask(rnd)
+            carrying = rnd.choice([10, 15, 50])
+            sum_weight = rnd.choice([0, 0.3, 7.77])
+            expected = select_orders(by_weight(candidates.values()), regions, mask, carrying, sum_weight)
+            assert columns.select(regions, mask, carrying, sum_weight) == expected
+
+
+@needs_numpy
+def test_pool_switches_to_columns(monkeypatch):
+    monkeypatch.setattr(pool_module, 'SCAN_LIMIT', 5)
+    rnd = Random(4)
+    order_pool = OrderPool()
+    order_pool.load(random_candidates(rnd, range(1, 500)), None)
+    calls = []
+    select = order_pool.columns.select
+    monkeypatch.setattr(order_pool.columns, 'select', lambda *args: calls.append(args) or select(*args))
+    for _ in range(100):
+        regions = set(rnd.sample(range(1, 8), rnd.randint(1, 4)))
+        mask = random_mask(rnd)
+        carrying = rnd.choice([10, 15, 50])
+        expected = select_orders(order_pool.candidates(regions), regions, mask, carrying)
+        assert order_pool.select(regions, mask, carrying) == expected
+    assert 0 < len(calls) < 100
+
+
+def test_pool_without_numpy(monkeypatch):
+    monkeypatch.setattr(kernel, 'available', False)
+    order_pool = OrderPool()
+    assert order_pool.columns is None
+    order_pool.load([Candidate(1, 3, frozenset([1]), hours_mask([TimeInterval(600, 660)])),
+                     Candidate(2, 1, frozenset([1]), hours_mask([TimeInterval(700, 760)]))], None)
+    assert order_pool.select({1}, hours_mask([TimeInterval(0, 1440)]), 10) == [2, 1]
+    assert order_pool.select({1}, hours_mask([TimeInterval(660, 700)]), 10) == []
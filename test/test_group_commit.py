@@ -0,0 +1,161 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from os import mkdir
+from os.path import exists
+from threading import Barrier
+import pytest
+from app import app, init_app
+from data import db_session
+from data.couriers import Courier
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+from data.dispatch_queries import lock_couriers, pool_state
+from data.orders import Order
+from data.stats_queries import computed_stats, stats_differences, stored_stats
+from dispatch.pool import pool
+
+THREADS = 8
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+def add_couriers():
+    json = {"data": [{"courier_id": courier_id, "courier_type": "car", "regions": [courier_id],
+                      "working_hours": ["00:00-23:59"]} for courier_id in range(1, THREADS + 1)]}
+    app.test_client().post('/couriers', json=json)
+
+
+def add_orders():
+    json = {"data": [{"order_id": order_id, "weight": 1, "region": order_id, "delivery_hours": ["00:00-23:59"]}
+                     for order_id in range(1, THREADS + 1)]}
+    app.test_client().post('/orders', json=json)
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_couriers()
+    add_orders()
+    app.config['TESTING'] = True
+    db_session.set_group_commit(True, window=0.05)
+    with app.test_client() as client:
+        yield client
+    db_session.set_group_commit(False)
+    reset_db(engine)
+
+
+def in_parallel(calls):
+    barrier = Barrier(len(calls))
+
+    def call(function):
+        barrier.wait()
+        return function()
+
+    with ThreadPoolExecutor(len(calls)) as executor:
+        return list(executor.map(call, calls))
+
+
+def complete_call(courier_id):
+    complete_time = (datetime.now() + timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return lambda: app.test_client().post('/orders/complete', json={
+        'courier_id': courier_id, 'order_id': courier_id, 'complete_time': complete_time}).status_code
+
+
+def test_parallel_completions_share_commits(client):
+    for courier_id in range(1, THREADS + 1):
+        client.post('/orders/assign', json={'courier_id': courier_id})
+    # назначения тоже идут через пишущий поток
+    before = client.get('/metrics').get_json()['group_commit']
+    assert in_parallel([complete_call(courier_id) for courier_id in range(1, THREADS + 1)]) == [200] * THREADS
+
+    stats = client.get('/metrics').get_json()['group_commit']
+    assert stats['enabled'] and stats['committed'] - before['committed'] == THREADS
+    assert stats['groups'] - before['groups'] < THREADS
+    sess = create_session()
+    assert sess.query(Order).filter(Order.complete_time == None).count() == 0
+    differences = stats_differences(stored_stats(sess), computed_stats(sess))
+    assert differences == {'deliveries': [], 'couriers': [], 'regions': []}
+    for courier_id in range(1, THREADS + 1):
+        assert client.get(f'/couriers/{courier_id}').get_json()['earnings'] == 500 * 9
+
+
+def test_parallel_assigns_share_commits(client):
+    before = client.get('/metrics').get_json()['group_commit']
+
+    def assign_call(courier_id):
+        return lambda: app.test_client().post('/orders/assign', json={'courier_id': courier_id}).get_json()
+
+    results = in_parallel([assign_call(courier_id) for courier_id in range(1, THREADS + 1)])
+    assigned = [[order['id'] for order in result['orders']] for result in results]
+    assert assigned == [[courier_id] for courier_id in range(1, THREADS + 1)]
+    stats = client.get('/metrics').get_json()['group_commit']
+    assert stats['committed'] - before['committed'] == THREADS and stats['groups'] - before['groups'] < THREADS
+    # изменения пула из одной группы применились по цепочке версий, пул не пришлось перечитывать
+    assert pool.state == pool_state(create_session()) and not pool.orders
+
+
+def test_patch_through_writer_returns_orders_to_pool(client):
+    client.post('/orders/assign', json={'courier_id': 1})
+    before = client.get('/metrics').get_json()['group_commit']['committed']
+    rv = client.patch('/couriers/1', json={'regions': [2]})
+    assert rv.status_code == 200 and rv.get_json()['regions'] == [2]
+    assert client.get('/metrics').get_json()['group_commit']['committed'] == before + 1
+    assert create_session().query(Order.courier_id).filter(Order.order_id == 1).scalar() is None
+    # снятый заказ вернулся в пул и достается другому курьеру без перечитывания пула из базы
+    client.patch('/couriers/3', json={'regions': [1, 3]})
+    assert [order['id'] for order in client.post('/orders/assign', json={'courier_id': 3}).get_json()['orders']] \
+        == [1, 3]
+
+
+def test_failed_work_rolls_back_alone(client):
+    def work(courier_id):
+        def run(sess):
+            lock_couriers(sess, [courier_id])
+            if courier_id % 2:
+                raise ValueError(courier_id)
+            return courier_id
+        return run
+
+    def call(courier_id):
+        try:
+            return db_session.write(work(courier_id))
+        except ValueError:
+            return 'error'
+
+    sess = create_session()
+    results = in_parallel([lambda courier_id=courier_id: call(courier_id) for courier_id in range(1, THREADS + 1)])
+    assert results == [courier_id if courier_id % 2 == 0 else 'error' for courier_id in range(1, THREADS + 1)]
+    versions = dict(sess.query(Courier.courier_id, Courier.version))
+    assert versions == {courier_id: 1 if courier_id % 2 else 2 for courier_id in range(1, THREADS + 1)}
+
+
+def test_write_without_group_commit(client):
+    db_session.set_group_commit(False)
+    assert client.get('/metrics').get_json()['group_commit'] == {'enabled': False}
+    assert db_session.write(lambda sess: lock_couriers(sess, [1]) or 'done') == 'done'
+    with pytest.raises(ValueError):
+        db_session.write(lambda sess: lock_couriers(sess, [2]) or int('x'))
+    sess = create_session()
+    assert sess.query(Courier.version).filter(Courier.courier_id == 1).scalar() == 2
+    assert sess.query(Courier.version).filter(Courier.courier_id == 2).scalar() == 1
+
+
+def test_init_app_starts_writer(client):
+    db_session.set_group_commit(False)
+    init_app('./db/test_base.db')
+    assert client.get('/metrics').get_json()['group_commit']['enabled'] == app.config['GROUP_COMMIT']
@@ -0,0 +1,27 @@
+from io import BytesIO
+from json import dumps
+import pytest
+from data.json_stream import JsonArrayReader
+
+
+def read(document, read_size=3):
+    return list(JsonArrayReader(BytesIO(document.encode()), read_size=read_size).items('data'))
+
+
+def test_items_split_across_reads():
+    data = [{"order_id": 1, "weight": 12.5, "hours": ["09:00-18:00"]}, 123456, "регион", [1, [2]], None, 7]
+    document = dumps({"meta": {"data": [0]}, "data": data, "tail": 1}, ensure_ascii=False)
+    for read_size in (1, 2, 3, 7, 1024):
+        assert read(document, read_size) == data
+
+
+def test_empty_array():
+    assert read(' { "data" : [ ] } ') == []
+
+
+@pytest.mark.parametrize('document', ['', '[]', '{}', '{"items": [1]}', '{"data": [1, 2', '{"data": [1 2]}',
+                                      '{"data": {"a": 1}}', '{1: [1]}', '{"data": [1]} x', '{"data": [1]}}',
+                                      '{"data": [1], "tail": }', '{"data": [1]'])
+def test_broken_documents(document):
+    with pytest.raises(ValueError):
+        read(document)
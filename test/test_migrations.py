@@ -0,0 +1,126 @@
+from os import mkdir, remove
+from os.path import exists
+import pytest
+import sqlalchemy as sa
+from app import app
+from data import db_session, migrations
+from data.couriers_type import CourierType
+from data.db_session import SqlAlchemyBase, create_session, global_init
+from data.query_plan import explain, full_scans, hot_queries
+from data.time_interval import hours_mask, parse_interval, unpack_mask
+
+DB_FILE = './db/test_migrations.db'
+
+
+@pytest.fixture(scope='function')
+def old_engine():
+    if not exists('./db'):
+        mkdir('./db')
+    if exists(DB_FILE):
+        remove(DB_FILE)
+    engine = sa.create_engine(f'sqlite:///{DB_FILE}')
+    SqlAlchemyBase.metadata.create_all(engine)
+    # база, созданная до появления индексов
+    for table in SqlAlchemyBase.metadata.sorted_tables:
+        for index in table.indexes:
+            index.drop(engine)
+    yield engine
+    engine.dispose()
+    remove(DB_FILE)
+
+
+def index_names(engine):
+    inspector = sa.inspect(engine)
+    return {index['name'] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+
+
+def test_upgrade_adds_indexes(old_engine):
+    expected = {index.name for table in SqlAlchemyBase.metadata.sorted_tables for index in table.indexes}
+    assert expected >= {'ix_orders_courier_id', 'ix_orders_complete_time', 'ix_orders_assign_time',
+                        'ix_orders_regions_order_id', 'ix_orders_regions_region', 'ix_regions_courier_id',
+                        'ix_Intervals_courier_id', 'ix_Intervals_delivery_order_id'}
+    assert index_names(old_engine) & expected == set()
+    migrations.upgrade(old_engine)
+    assert index_names(old_engine) >= expected
+    migrations.upgrade(old_engine)
+    assert index_names(old_engine) >= expected
+
+
+def test_hot_queries_use_indexes():
+    if not exists('./db'):
+        mkdir('./db')
+    global_init('./db/test_base.db')
+    sess = create_session()
+    for name, query in hot_queries(sess).items():
+        assert full_scans(explain(sess, query)) == [], name
+
+
+def test_upgrade_backfills_hours_masks(old_engine):
+    # база, созданная до появления масок рабочих часов
+    old_engine.execute('ALTER TABLE couriers DROP COLUMN hours_mask')
+    old_engine.execute('ALTER TABLE orders DROP COLUMN hours_mask')
+    old_engine.execute("INSERT INTO couriers (courier_id, courier_type) VALUES (1, 'foot'), (2, 'car')")
+    old_engine.execute('INSERT INTO "Intervals" (courier_id, time_start, time_stop) VALUES '
+                       "(1, '09:00:00.000000', '11:00:00.000000'), (1, '11:35:00.000000', '14:05:00.000000')")
+    old_engine.execute('INSERT INTO orders (order_id, weight) VALUES (1, 3)')
+    old_engine.execute('INSERT INTO "Intervals_delivery" (order_id, time_start, time_stop) VALUES '
+                       "(1, '10:00:00.000000', '11:00:00.000000')")
+    migrations.upgrade(old_engine)
+    masks = dict(old_engine.execute('SELECT courier_id, hours_mask FROM couriers').fetchall())
+    assert unpack_mask(masks[1]) == hours_mask([parse_interval('09:00-11:00'), parse_interval('11:35-14:05')])
+    assert unpack_mask(masks[2]) == 0
+    order_mask, = old_engine.execute('SELECT hours_mask FROM orders').first()
+    assert unpack_mask(order_mask) == parse_interval('10:00-11:00').mask
+    migrations.upgrade(old_engine)
+
+
+def test_upgrade_backfills_deliveries_and_stats(old_engine):
+    # заказы, назначенные и завершенные до появления развозов и статистики
+    old_engine.execute("INSERT INTO couriers_type (type, carrying, coefficient) VALUES ('car', 50, 9)")
+    old_engine.execute("INSERT INTO couriers (courier_id, courier_type) VALUES (1, 'car')")
+    old_engine.execute('INSERT INTO orders (order_id, weight, courier_id, assign_time, complete_time, '
+                       "type_for_delivery) VALUES "
+                       "(1, 1, 1, '2021-01-01 10:00:00.000000', '2021-01-01 10:10:00.000000', 'car'), "
+                       "(2, 1, 1, '2021-01-01 10:00:00.000000', '2021-01-01 10:30:00.000000', 'car'), "
+                       "(3, 1, 1, '2021-01-01 11:00:00.000000', NULL, 'car')")
+    old_engine.execute('INSERT INTO orders_regions (order_id, region) VALUES (1, 1), (2, 1), (3, 1)')
+    migrations.upgrade(old_engine)
+    deliveries = old_engine.execute('SELECT id, orders_count, completed_count FROM deliveries ORDER BY assign_time')
+    (first, *first_counts), (second, *second_counts) = deliveries.fetchall()
+    assert first_counts == [2, 2] and second_counts == [1, 0]
+    owners = dict(old_engine.execute('SELECT order_id, delivery_id FROM orders').fetchall())
+    assert owners == {1: first, 2: first, 3: second}
+    stats = old_engine.execute('SELECT completed_deliveries, earnings FROM courier_stats').fetchall()
+    assert stats == [(1, 500 * 9)]
+    delivery_us, = old_engine.execute('SELECT delivery_us FROM courier_region_stats').first()
+    assert delivery_us == 30 * 60 * 10 ** 6
+    migrations.upgrade(old_engine)
+    assert old_engine.execute('SELECT count(*) FROM deliveries').scalar() == 2
+
+
+def test_upgraded_couriers_get_version():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    # база, созданная до появления версий курьеров
+    db_session.remove_session()
+    engine.execute('ALTER TABLE couriers DROP COLUMN version')
+    # у соединений пула могла остаться старая схема
+    engine.dispose()
+    migrations.upgrade(engine)
+    engine.dispose()
+    version, = [column for column in sa.inspect(engine).get_columns('couriers') if column['name'] == 'version']
+    assert not version['nullable'] and version['default'] == "'1'"
+    engine.execute("INSERT INTO couriers (courier_id, courier_type) VALUES (2, 'car')")
+    assert engine.execute('SELECT version FROM couriers WHERE courier_id = 2').scalar() == 1
+
+    sess = create_session()
+    sess.add(CourierType(type='car', carrying=50, coefficient=9))
+    sess.commit()
+    client = app.test_client()
+    rv = client.post('/couriers', json={'data': [{'courier_id': 1, 'courier_type': 'car', 'regions': [1],
+                                                  'working_hours': ['09:00-18:00']}]})
+    assert rv.status_code == 201
+    assert client.get('/couriers/1').status_code == 200
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
@@ -0,0 +1,161 @@
+from datetime import time
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data import db_session
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+from data import dispatch_queries
+from data.deliveries import Delivery
+from data.dispatch_queries import bump_pool_state, pool_state, sync_pool
+from data.intervals_delivery import IntervalDelivery
+from data.orders import Order
+from data.orders_regions import OrderRegion
+from data.time_interval import TimeInterval, pack_mask
+from dispatch.engine import Candidate
+from dispatch.pool import OrderPool, pool
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+def add_courier():
+    json = {"data": [
+        {
+            "courier_id": 1,
+            "courier_type": "car",
+            "regions": [11, 12],
+            "working_hours": ["09:00-18:00"]
+        }
+    ]}
+    app.test_client().post('/couriers', json=json)
+
+
+def add_orders(orders):
+    json = {"data": [{"order_id": order_id, "weight": weight, "region": region, "delivery_hours": ["10:00-11:00"]}
+                     for order_id, weight, region in orders]}
+    return app.test_client().post('/orders', json=json)
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_courier()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def pool_ids():
+    return sorted(pool.orders)
+
+
+def test_candidates_merge_regions():
+    order_pool = OrderPool()
+    order_pool.add_all([Candidate(1, 5, frozenset([1]), 0), Candidate(2, 1, frozenset([2]), 0),
+                        Candidate(3, 3, frozenset([1, 2]), 0), Candidate(4, 3, frozenset([3]), 0),
+                        Candidate(5, 1, frozenset([1]), 0)])
+    assert [candidate.order_id for candidate in order_pool.candidates([1, 2])] == [2, 5, 3, 1]
+    order_pool.remove_all([3, 5])
+    assert [candidate.order_id for candidate in order_pool.candidates([1, 2])] == [2, 1]
+    assert order_pool.buckets == {1: [(5, 1)], 2: [(1, 2)], 3: [(3, 4)]}
+    order_pool.add(Candidate(1, 0.5, frozenset([3]), 0))
+    assert order_pool.buckets == {2: [(1, 2)], 3: [(0.5, 1), (3, 4)]}
+
+
+def test_apply_marks_pool_stale():
+    order_pool = OrderPool()
+    order_pool.load([], ('a', 1))
+    order_pool.apply(('a', 1), ('a', 2), lambda p: p.add(Candidate(1, 1, frozenset([1]), 0)))
+    assert order_pool.state == ('a', 2) and list(order_pool.orders) == [1]
+    order_pool.apply(('a', 3), ('a', 4), lambda p: p.remove(1))
+    assert order_pool.state is None and list(order_pool.orders) == [1]
+
+
+def test_pool_follows_write_paths(client):
+    sync_pool(create_session())
+    add_orders([(1, 3, 11), (2, 4, 12), (3, 5, 13)])
+    assert pool.state == pool_state(create_session())
+    assert pool_ids() == [1, 2, 3]
+    client.post('/orders/assign', json={'courier_id': 1})
+    assert pool.state == pool_state(create_session())
+    assert pool_ids() == [3]
+    client.patch('/couriers/1', json={'regions': [12]})
+    assert pool.state == pool_state(create_session())
+    assert pool_ids() == [1, 3]
+    assert [candidate.order_id for candidate in pool.candidates([11, 13])] == [1, 3]
+
+
+def test_pool_reloads_after_foreign_write(client):
+    add_orders([(1, 3, 11), (2, 4, 12)])
+    sync_pool(create_session())
+    # другой процесс добавил заказ 5 и увеличил версию
+    sess = create_session()
+    mask = pack_mask(TimeInterval.from_times(time(10), time(11)).mask)
+    sess.execute(Order.__table__.insert(), {'order_id': 5, 'weight': 1, 'hours_mask': mask})
+    sess.execute(OrderRegion.__table__.insert(), {'order_id': 5, 'region': 11})
+    sess.execute(IntervalDelivery.__table__.insert(), {'order_id': 5, 'time_start': time(10), 'time_stop': time(11)})
+    bump_pool_state(sess)
+    sess.commit()
+    assert pool_ids() == [1, 2]
+    rv = client.post('/orders/assign', json={'courier_id': 1})
+    assert [order['id'] for order in rv.get_json()['orders']] == [5, 1, 2]
+    assert pool_ids() == []
+
+
+def test_skipped_claims_mark_pool_stale(client, monkeypatch):
+    monkeypatch.setattr(db_session, 'SKIP_LOCKED_DIALECTS', frozenset(['sqlite']))
+    add_orders([(1, 3, 11), (2, 4, 12)])
+    sync_pool(create_session())
+    # заказа 9 нет в базе: SELECT ... FOR UPDATE SKIP LOCKED его не вернет, как заблокированную строку
+    with pool.lock:
+        pool.add(Candidate(9, 1, frozenset([11]), TimeInterval.from_times(time(10), time(11)).mask))
+    rv = client.post('/orders/assign', json={'courier_id': 1})
+    assert [order['id'] for order in rv.get_json()['orders']] == [1, 2]
+    assert pool.state is None
+    sync_pool(create_session())
+    assert pool.state == pool_state(create_session()) and pool_ids() == []
+
+
+def test_claimed_orders_survive_pool_changes(client, monkeypatch):
+    add_orders([(1, 20, 11), (2, 25, 12), (3, 3, 11), (4, 4, 12)])
+    sync_pool(create_session())
+    mask = TimeInterval.from_times(time(10), time(11)).mask
+    late = [pool.orders[3], pool.orders[4]]
+    with pool.lock:
+        pool.remove_all([3, 4])
+        # заказа 9 нет в базе: его захват проиграется, и подбор пойдет на второй круг
+        pool.add(Candidate(9, 1, frozenset([11]), mask))
+    claim_orders = dispatch_queries.claim_orders
+
+    def claim_and_ingest(*args):
+        won = claim_orders(*args)
+        # пока идет захват, параллельная загрузка добавляет в пул легкие заказы 3 и 4
+        with pool.lock:
+            pool.add_all(late)
+        return won
+
+    monkeypatch.setattr(dispatch_queries, 'claim_orders', claim_and_ingest)
+    rv = client.post('/orders/assign', json={'courier_id': 1})
+    assert [order['id'] for order in rv.get_json()['orders']] == [3, 1, 2]
+    sess = create_session()
+    assigned = sorted(order_id for order_id, in sess.query(Order.order_id).filter(Order.courier_id == 1))
+    assert assigned == [1, 2, 3]
+    assert sess.query(Delivery.orders_count).filter(Delivery.courier_id == 1).scalar() == 3
+    assert pool_ids() == [4]
@@ -2,6 +2,7 @@ from datetime import datetime
 from json import loads
 import pytest
 from app import app
+from data.couriers import Courier
 from data.couriers_type import CourierType
 from data.db_session import create_session, SqlAlchemyBase
 from data.db_session import global_init
@@ -119,6 +120,14 @@ def test_none_orders(client):
     assert loads(rv.data) == {"orders": []}
 
 
+def test_repeated_assign_does_not_write(client):
+    first = client.post('/orders/assign', json={'courier_id': 2}).get_json()
+    assert client.post('/orders/assign', json={'courier_id': 2}).get_json() == first
+    # развоз уже есть: повтор только читает базу, версия курьера выросла один раз - при первом назначении
+    assert create_session().query(Courier.version).filter(Courier.courier_id == 2).scalar() == 2
+    assert client.get('/metrics').get_json()['pool'] == {'orders': 1}
+
+
 def test_before_complete_order(client):
     sess = create_session()
     json_assign = {
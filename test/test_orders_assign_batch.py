@@ -0,0 +1,101 @@
+from datetime import datetime
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+from data.orders import Order
+from dispatch.pool import pool
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_order():
+    json = {"data": [
+        {"order_id": 1, "weight": 0.23, "region": 11, "delivery_hours": ["08:00-09:00"]},
+        {"order_id": 2, "weight": 7, "region": 11, "delivery_hours": ["08:00-09:00"]},
+        {"order_id": 3, "weight": 8, "region": 11, "delivery_hours": ["08:00-09:00"]},
+        {"order_id": 4, "weight": 3, "region": 12, "delivery_hours": ["12:00-13:00"]},
+        {"order_id": 5, "weight": 2, "region": 11, "delivery_hours": ["12:00-13:00"]},
+    ]}
+    app.test_client().post('/orders', json=json)
+
+
+def add_courier():
+    json = {"data": [
+        {"courier_id": 1, "courier_type": "foot", "regions": [11], "working_hours": ["08:00-13:00"]},
+        {"courier_id": 2, "courier_type": "bike", "regions": [11, 12], "working_hours": ["08:00-13:00"]},
+        {"courier_id": 3, "courier_type": "car", "regions": [666], "working_hours": ["08:00-13:00"]},
+    ]}
+    app.test_client().post('/couriers', json=json)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+# функция которая будет выполняться перед началом тестов
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_courier()
+    add_order()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def order_ids(result):
+    return [order['id'] for order in result['orders']]
+
+
+def test_batch_assign(client):
+    rv = client.post('/orders/assign/batch', json={'courier_ids': [1, 2, 3]})
+    assert rv.status_code == 200
+    couriers = rv.get_json()['couriers']
+    assert [result['courier_id'] for result in couriers] == [1, 2, 3]
+    # курьеры обслуживаются по порядку, каждый заказ достается одному
+    assert order_ids(couriers[0]) == [1, 5, 2]
+    assert order_ids(couriers[1]) == [4, 3]
+    assert couriers[2] == {'courier_id': 3, 'orders': []}
+    assert couriers[0]['assign_time'] == couriers[1]['assign_time']
+
+    assign_time = datetime.strptime(couriers[0]['assign_time'], '%Y-%m-%dT%H:%M:%S.%fZ')
+    sess = create_session()
+    orders = sess.query(Order).filter(Order.assign_time == assign_time).all()
+    assigned = {order.order_id: order.courier_id for order in orders}
+    assert assigned == {1: 1, 5: 1, 2: 1, 4: 2, 3: 2}
+    assert list(pool.orders) == []
+
+
+def test_batch_same_as_single_assign(client):
+    rv = client.post('/orders/assign/batch', json={'courier_ids': [2]})
+    assert order_ids(rv.get_json()['couriers'][0]) == [1, 5, 4, 2]
+    # у курьера есть незавершенные заказы, повторное назначение возвращает их же, как и одиночное
+    single = client.post('/orders/assign', json={'courier_id': 2}).get_json()
+    assert single['assign_time'] == rv.get_json()['couriers'][0]['assign_time']
+    rv = client.post('/orders/assign/batch', json={'courier_ids': [1, 2]})
+    couriers = rv.get_json()['couriers']
+    assert couriers[1] == dict(courier_id=2, **single)
+    assert order_ids(couriers[0]) == [3]
+
+
+def test_batch_wrong_request(client):
+    for json in ({}, {'courier_ids': 1}, {'courier_ids': ['1']}, {'courier_ids': [1, 1]}, {'courier_ids': [1, 4]},
+                 {'courier_ids': [1], 'courier_id': 1}):
+        rv = client.post('/orders/assign/batch', json=json)
+        assert rv.status_code == 400
+    assert create_session().query(Order).filter(Order.courier_id != None).all() == []
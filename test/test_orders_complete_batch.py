@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data.complete_queries import parse_timestamp
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+from data.orders import Order
+from data.stats_queries import computed_stats, stats_differences, stored_stats
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+def add_couriers():
+    json = {"data": [
+        {"courier_id": 1, "courier_type": "car", "regions": [1, 2], "working_hours": ["00:00-23:59"]},
+        {"courier_id": 2, "courier_type": "bike", "regions": [3], "working_hours": ["00:00-23:59"]}]}
+    app.test_client().post('/couriers', json=json)
+
+
+def add_orders():
+    json = {"data": [{"order_id": order_id, "weight": 1, "region": region, "delivery_hours": ["00:00-23:59"]}
+                     for order_id, region in ((1, 1), (2, 2), (3, 1), (4, 3))]}
+    app.test_client().post('/orders', json=json)
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    add_couriers()
+    add_orders()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def timestamp(minutes):
+    return (datetime.now() + timedelta(minutes=minutes)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def item(courier_id, order_id, complete_time):
+    return {'courier_id': courier_id, 'order_id': order_id, 'complete_time': complete_time}
+
+
+def complete_batch(client, items):
+    rv = client.post('/orders/complete/batch', json={'data': items})
+    assert rv.status_code == 200
+    return [order['status'] for order in rv.get_json()['orders']]
+
+
+def consistent():
+    sess = create_session()
+    differences = stats_differences(stored_stats(sess), computed_stats(sess))
+    return differences == {'deliveries': [], 'couriers': [], 'regions': []}
+
+
+def test_complete_batch(client):
+    client.post('/orders/assign', json={'courier_id': 1})
+    client.post('/orders/assign', json={'courier_id': 2})
+    items = [item(1, 1, timestamp(10)),
+             item(1, 1, timestamp(20)),
+             item(2, 2, timestamp(10)),
+             item(1, 99, timestamp(10)),
+             item(1, 3, '2021-13-01T10:00:00.00Z'),
+             item(1, 3, timestamp(-60)),
+             {'courier_id': 1, 'order_id': 3},
+             item(1, 2, timestamp(15)),
+             item(1, 3, timestamp(30)),
+             item(2, 4, timestamp(5))]
+    assert complete_batch(client, items) == ['completed', 'already_completed', 'rejected', 'rejected', 'rejected',
+                                             'rejected', 'rejected', 'completed', 'completed', 'completed']
+    assert consistent()
+    courier = client.get('/couriers/1').get_json()
+    assert courier['earnings'] == 500 * 9 and 'rating' in courier
+    assert client.get('/couriers/2').get_json()['earnings'] == 500 * 5
+
+    # повтор всей пачки, например после обрыва связи, ничего не меняет
+    assert complete_batch(client, items) == ['already_completed', 'already_completed', 'rejected', 'rejected',
+                                             'rejected', 'already_completed', 'rejected', 'already_completed',
+                                             'already_completed', 'already_completed']
+    assert consistent()
+    assert client.get('/couriers/1').get_json() == courier
+    sess = create_session()
+    assert sess.query(Order.complete_time).filter(Order.order_id == 1).scalar() == parse_timestamp(items[0][
+        'complete_time'])
+
+
+def test_matches_single_completions(client):
+    client.post('/orders/assign', json={'courier_id': 1})
+    assert complete_batch(client, [item(1, 3, timestamp(30))]) == ['completed']
+    rv = client.post('/orders/complete', json=item(1, 1, timestamp(10)))
+    assert rv.status_code == 200
+    statuses = complete_batch(client, [item(1, 1, timestamp(40)), item(1, 2, timestamp(20))])
+    assert statuses == ['already_completed', 'completed']
+    assert consistent()
+
+
+def test_bad_payload(client):
+    for payload in ([], {'data': {}}, {'data': [], 'extra': 1}, {'items': []}):
+        assert client.post('/orders/complete/batch', json=payload).status_code == 400
+    assert complete_batch(client, []) == []
+
+
+def test_parse_timestamp():
+    for value in ('2021-01-10T10:33:01.42Z', '2021-01-10T10:33:01.123456Z', '2021-1-5T9:3:1.0Z'):
+        assert parse_timestamp(value) == datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+    for value in ('2021-01-10T10:33:01Z', '2021-02-30T10:33:01.42Z', '2021-01-10 10:33:01.42Z', '1.2Z'):
+        with pytest.raises(ValueError):
+            parse_timestamp(value)
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import mkdir
+from os.path import exists
+import pytest
+from app import app
+from data import db_session
+from data.couriers_type import CourierType
+from data.db_session import create_session, SqlAlchemyBase
+from data.db_session import global_init
+
+THREADS = 8
+
+
+def reset_db(engine):
+    SqlAlchemyBase.metadata.drop_all(engine)
+    SqlAlchemyBase.metadata.create_all(engine)
+
+
+def add_types(session):
+    types = (('foot', 10, 2), ('bike', 15, 5), ('car', 50, 9))
+    for title, carrying, coefficient in types:
+        typee = CourierType(type=title, carrying=carrying, coefficient=coefficient)
+        session.add(typee)
+    session.commit()
+
+
+@pytest.fixture(scope='function')
+def client():
+    if not exists('./db'):
+        mkdir('./db')
+    engine = global_init('./db/test_base.db')
+    add_types(create_session())
+    db_session.remove_session()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    reset_db(engine)
+
+
+def request(courier_id):
+    client = app.test_client()
+    client.post('/couriers', json={'data': [{'courier_id': courier_id, 'courier_type': 'car', 'regions': [courier_id],
+                                             'working_hours': ['00:00-23:59']}]})
+    client.post('/orders', json={'data': [{'order_id': courier_id, 'weight': 1, 'region': courier_id,
+                                           'delivery_hours': ['00:00-23:59']}]})
+    client.post('/orders/assign', json={'courier_id': courier_id})
+    return client.get(f'/couriers/{courier_id}').status_code
+
+
+def test_connections_return_to_pool(client):
+    # счетчик общий на процесс: соединения, которые держат чужие сессии, сюда не относятся
+    before = client.get('/metrics').get_json()['db_pool']['checked_out']
+    with ThreadPoolExecutor(THREADS) as executor:
+        assert list(executor.map(request, range(1, THREADS * 4 + 1))) == [200] * THREADS * 4
+    assert client.get('/metrics').get_json()['db_pool']['checked_out'] == before
+
+
+def test_request_uses_one_session(client):
+    sessions = []
+    with app.test_request_context():
+        sessions.append(create_session())
+        sessions.append(create_session())
+    with app.test_request_context():
+        sessions.append(create_session())
+    assert sessions[0] is sessions[1] and sessions[1] is not sessions[2]
+
+
+def test_duplicate_ids_rejected(client):
+    json = {'data': [{'courier_id': 1, 'courier_type': 'car', 'regions': [1], 'working_hours': ['00:00-23:59']}]}
+    assert client.post('/couriers', json=json).status_code == 201
+    assert client.post('/couriers', json=json).status_code == 400
+    order = {'data': [{'order_id': 1, 'weight': 1, 'region': 1, 'delivery_hours': ['00:00-23:59']}]}
+    assert client.post('/orders', json=order).status_code == 201
+    assert client.post('/orders', json=order).status_code == 400
@@ -0,0 +1,62 @@
+from datetime import datetime
+from itertools import product
+import pytest
+from data.time_interval import MASK_BYTES, TimeInterval, hours_mask, pack_mask, parse_interval, unpack_mask
+
+
+def legacy_parse(value):
+    value = value.split('-')
+    time_stop = datetime.strptime(value[1], '%H:%M')
+    time_start = datetime.strptime(value[0], '%H:%M')
+    assert time_stop > time_start
+    return time_start.time(), time_stop.time()
+
+
+VALUES = ['09:00-18:00', '8:00-9:00', '08:0-08:5', '00:00-23:59', '9:5-10:05', '11:35-14:05-16:00', '10:00-10:00',
+          '18:00-09:00', '24:00-25:00', '09:60-10:00', '09:00', '9-10', '09:00 -10:00', ' 09:00-10:00', '09:00-10:00 ',
+          '0900-1000', '', '-', '09:00-', '009:00-10:00', '09:000-10:00', 'ab:cd-ef:gh', '０9:00-10:00', '٠٩:00-10:00']
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_parse_matches_strptime(value):
+    try:
+        expected = legacy_parse(value)
+    except (ValueError, AssertionError, IndexError):
+        with pytest.raises((ValueError, IndexError)):
+            parse_interval(value)
+        return
+    interval = parse_interval(value)
+    assert (interval.time_start, interval.time_stop) == expected
+    assert str(interval) == f'{expected[0].strftime("%H:%M")}-{expected[1].strftime("%H:%M")}'
+
+
+def test_parse_wrong_type():
+    for value in (None, 13, ['09:00-10:00']):
+        with pytest.raises(TypeError):
+            parse_interval(value)
+
+
+def test_overlaps_matches_time_comparison():
+    hours = [TimeInterval(start, stop) for start, stop in product(range(0, 1440, 45), repeat=2) if stop > start]
+    for first, second in product(hours[::7], hours[::5]):
+        expected = second.time_stop > first.time_start and first.time_stop > second.time_start
+        assert first.overlaps(second) == expected
+        assert second.overlaps(first) == expected
+
+
+def test_mask_matches_overlaps():
+    hours = [TimeInterval(start, stop) for start, stop in product(range(0, 1440, 45), repeat=2) if stop > start]
+    hours.extend([TimeInterval(0, 1), TimeInterval(1438, 1439), TimeInterval(0, 1439), TimeInterval(600, 660)])
+    for first, second in product(hours[::3], hours[::4]):
+        assert bool(first.mask & second.mask) == first.overlaps(second)
+    # касание концов интервалов не считается пересечением
+    assert TimeInterval(540, 600).mask & TimeInterval(600, 660).mask == 0
+    assert TimeInterval(540, 601).mask & TimeInterval(600, 660).mask != 0
+
+
+def test_pack_mask():
+    mask = hours_mask([TimeInterval(0, 1), TimeInterval(600, 660), TimeInterval(1438, 1439)])
+    assert len(pack_mask(mask)) == MASK_BYTES
+    assert unpack_mask(pack_mask(mask)) == mask
+    assert unpack_mask(None) == 0
+    assert hours_mask([]) == 0
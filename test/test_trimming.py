@@ -0,0 +1,51 @@
+from itertools import combinations
+from random import Random
+import pytest
+from dispatch.engine import Candidate
+from dispatch.trimming import first_fit, heaviest_first, max_weight, strategy
+
+
+def candidates(weights):
+    return [Candidate(order_id, weight, frozenset([1]), 1) for order_id, weight in enumerate(weights, 1)]
+
+
+def kept_weight(items, dropped):
+    return round(sum(item.weight for item in items if item.order_id not in dropped), 2)
+
+
+def best_weight(items, carrying):
+    return max(round(sum(item.weight for item in subset), 2) for size in range(len(items) + 1)
+               for subset in combinations(items, size) if round(sum(item.weight for item in subset), 2) <= carrying)
+
+
+def test_downgrade_to_foot():
+    items = candidates([3, 4, 5, 6])
+    assert heaviest_first(items, 10) == [4, 3]
+    assert max_weight(items, 10) == [3, 1]
+    assert kept_weight(items, max_weight(items, 10)) == 10
+    assert max_weight(items, 18) == []
+
+
+def test_max_weight_is_optimal():
+    rnd = Random(0)
+    for _ in range(200):
+        items = candidates([rnd.randint(1, 2000) / 100 for _ in range(rnd.randint(1, 10))])
+        carrying = rnd.choice([10, 15, 50])
+        dropped = max_weight(items, carrying)
+        assert len(set(dropped)) == len(dropped)
+        assert kept_weight(items, dropped) == best_weight(items, carrying)
+        assert kept_weight(items, dropped) >= kept_weight(items, heaviest_first(items, carrying))
+        assert kept_weight(items, first_fit(items, carrying)) <= carrying
+
+
+def test_time_limit_falls_back_to_first_fit():
+    items = candidates([Random(1).randint(1, 5000) / 100 for _ in range(300)])
+    assert max_weight(items, 50, time_limit=0) == first_fit(items, 50)
+
+
+def test_strategy():
+    items = candidates([3, 4, 5, 6])
+    assert strategy('heaviest')(items, 10) == [4, 3]
+    assert strategy('knapsack', time_limit=0)(items, 10) == first_fit(items, 10)
+    with pytest.raises(ValueError):
+        strategy('random')
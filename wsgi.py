@@ -1,13 +1,7 @@
-from app import app, add_courier_types
-from data import db_session
-from os.path import exists
-from os import mkdir
+from app import app, init_app
 
 
-if not exists('./db'):
-    mkdir('./db')
-db_session.global_init('db/base.db')
-add_courier_types()
+init_app(app.config['DATABASE_URL'])
 
 if __name__ == "__main__":
     app.run()